@@ -0,0 +1,102 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+
+class AgentQueueFull(Exception):
+    """Raised when all agent slots are busy and the wait queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many requests, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class AgentQueue:
+    """
+    Admission control for agent runs.
+
+    At most `concurrency` agent runs happen at the same time (set it to the number
+    of requests Ollama serves in parallel, OLLAMA_NUM_PARALLEL), up to `max_waiting`
+    more requests wait for a free slot and any further request is rejected right
+    away with AgentQueueFull, which carries a Retry-After estimate based on the
+    average run time. So under load requests wait a bounded time or are turned
+    away instead of piling up on the Ollama server.
+    Values come from AGENT_CONCURRENCY, AGENT_QUEUE_SIZE and AGENT_TIMEOUT.
+    """
+
+    def __init__(self, concurrency=None, max_waiting=None, timeout=None):
+        self.concurrency = concurrency or int(os.getenv("AGENT_CONCURRENCY", "2"))
+        self.max_waiting = int(os.getenv("AGENT_QUEUE_SIZE", "8")) if max_waiting is None else max_waiting
+        # Seconds a request may take in total, waiting in the queue included
+        self.timeout = float(os.getenv("AGENT_TIMEOUT", "120")) if timeout is None else timeout
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.avg_run_time = None
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a new request would get a slot"""
+        run_time = self.avg_run_time or 5.0
+        return max(1, math.ceil(run_time * (self.waiting + 1) / self.concurrency))
+
+    def check(self):
+        """Raise AgentQueueFull when a new request would be rejected"""
+        if self.running + self.waiting >= self.concurrency + self.max_waiting:
+            self.rejected += 1
+            raise AgentQueueFull(self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a free slot for the duration of an agent run, raises AgentQueueFull when the queue is full"""
+        self.check()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+            run_time = time.monotonic() - start
+            # Moving average, so the estimate follows the current load
+            self.avg_run_time = run_time if self.avg_run_time is None else 0.8 * self.avg_run_time + 0.2 * run_time
+            self.completed += 1
+
+    @asynccontextmanager
+    async def run(self):
+        """
+        slot() with the request timeout applied to waiting and running.
+
+        When the timeout expires the request's task is cancelled, which stops the
+        agent run, and TimeoutError is raised.
+        """
+        try:
+            async with asyncio.timeout(self.timeout):
+                async with self.slot():
+                    yield
+        except TimeoutError:
+            self.timed_out += 1
+            raise
+
+    def stats(self) -> dict:
+        """Counters of the queue"""
+        return {
+            "concurrency": self.concurrency,
+            "max_waiting": self.max_waiting,
+            "timeout": self.timeout,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_run_time": round(self.avg_run_time, 3) if self.avg_run_time is not None else None,
+        }
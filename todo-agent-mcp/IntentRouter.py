@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+from collections import namedtuple
+
+# A tool call the router is confident about
+Intent = namedtuple("Intent", ["name", "tool", "arguments"])
+
+IDS = r"#?(\d+(?:\s*(?:,|and|&)\s*#?\d+)*)"
+ITEM = r"(?:\s+(?:todos?|tasks?|items?))?"
+
+
+def parse_ids(text) -> list:
+    return [int(todo_id) for todo_id in re.findall(r"\d+", text)]
+
+
+def list_intent(match):
+    arguments = {"compact": False}
+    status = match.group(1)
+    if status in ("done", "completed", "finished"):
+        arguments["status"] = "completed"
+    elif status in ("pending", "open"):
+        arguments["status"] = "pending"
+    return arguments
+
+
+def ids_intent(single_tool, batch_tool):
+    def build(match):
+        todo_ids = parse_ids(match.group(1))
+        if len(todo_ids) == 1:
+            return single_tool, {"todo_id": todo_ids[0]}
+        return batch_tool, {"todo_ids": todo_ids}
+    return build
+
+
+# (intent name, pattern, function building (tool, arguments) from the match)
+INTENTS = [
+    ("list",
+     re.compile(r"^(?:list|show)(?: me)?(?: all)?(?: my)?(?: (pending|open|completed|done|finished))? (?:todos|tasks|todo list)$"),
+     lambda match: ("list_all_todos", list_intent(match))),
+    ("complete",
+     re.compile(rf"^(?:complete|finish|mark){ITEM}\s+{IDS}(?: as (?:done|completed|complete|finished))?$"),
+     ids_intent("complete_todo_task", "complete_todo_tasks")),
+    ("delete",
+     re.compile(rf"^(?:delete|remove){ITEM}\s+{IDS}$"),
+     ids_intent("delete_todo_task", "delete_todo_tasks")),
+    ("upcoming",
+     re.compile(r"^(?:show |list |check )?(?:my )?(?:upcoming|due soon) (?:todos|tasks)$"),
+     lambda match: ("check_upcoming_todos_task", {"response": True})),
+    ("search",
+     re.compile(r"^(?:find|search(?: for)?) (?:todos?|tasks?)(?: (?:about|for|with|called|named))? (.+)$"),
+     lambda match: ("search_todos", {"query": match.group(1)})),
+]
+
+
+def normalize(message) -> str:
+    """Lowercase, collapse whitespace and drop polite prefixes and trailing punctuation"""
+    text = re.sub(r"\s+", " ", str(message).strip().lower()).rstrip(" ?!.")
+    return re.sub(r"^(?:please |can you |could you )+", "", text)
+
+
+class IntentRouter:
+    """
+    Rule-based parser for plain commands like "list pending todos", "complete 12"
+    or "delete task 7".
+
+    match() returns the tool call for a message when it matches one of the
+    intents exactly and None otherwise, in which case the message goes to the
+    LLM agent as usual. Which intents are enabled is set with the INTENT_ROUTER
+    environment variable: "all" (default), "off", or a comma-separated list of
+    intent names (list, complete, delete, upcoming, search).
+    """
+
+    def __init__(self, intents=None, enabled=None):
+        intents = intents or INTENTS
+        if enabled is None:
+            enabled = os.getenv("INTENT_ROUTER", "all").lower()
+        if enabled in ("off", "false", "0", "none", ""):
+            names = set()
+        elif enabled == "all":
+            names = {name for name, _, _ in intents}
+        else:
+            names = {name.strip() for name in enabled.split(",")}
+        self.intents = [intent for intent in intents if intent[0] in names]
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent = {}
+
+    def match(self, message):
+        """Return the Intent for a message, or None when the agent should handle it"""
+        text = normalize(message)
+        for name, pattern, build in self.intents:
+            match = pattern.match(text)
+            if match:
+                tool, arguments = build(match)
+                with self.lock:
+                    self.hits += 1
+                    self.hits_by_intent[name] = self.hits_by_intent.get(name, 0) + 1
+                return Intent(name, tool, arguments)
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        """Hit counters of the router"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "intents": [name for name, _, _ in self.intents],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "hits_by_intent": dict(self.hits_by_intent),
+            }
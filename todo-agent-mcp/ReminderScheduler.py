@@ -0,0 +1,148 @@
+import heapq
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("todo_agent.reminders")
+
+DEFAULT_REMINDER_HOURS = 24
+RETRY_DELAY = timedelta(minutes=1)
+# Seconds between checks for todos changed by other processes sharing the storage
+SYNC_INTERVAL = 30
+
+
+class ReminderScheduler:
+    """
+    Sends reminder emails for pending todos in a background thread.
+
+    Pending todos are kept in a heap ordered by the time their reminder is due
+    (due time minus the reminder window). The thread sleeps until the earliest
+    reminder, sends all reminders that are due in one email and records the
+    reminded IDs in a state file, so every todo is reminded exactly once even
+    across server restarts. Changes are picked up through TodoManager listeners
+    instead of rescanning the todo list.
+    """
+
+    def __init__(self, todo_manager, email_manager, state_file="reminders_sent.json",
+                 hours=DEFAULT_REMINDER_HOURS):
+        self.todo_manager = todo_manager
+        self.email_manager = email_manager
+        self.state_file = state_file
+        self.window = timedelta(hours=hours)
+        self.condition = threading.Condition()
+        self.heap = []
+        self.pending = {}
+        self.sent = self.load_sent()
+        self.thread = None
+        self.running = False
+
+        todo_manager.add_listener(self.on_todo_change)
+
+    def load_sent(self) -> set:
+        """Load IDs of todos that were already reminded"""
+        try:
+            with open(self.state_file) as f:
+                return set(json.load(f))
+        except FileNotFoundError:
+            return set()
+        except Exception as e:
+            logger.error(f"Error loading reminder state: {e}")
+            return set()
+
+    def save_sent(self):
+        """Persist reminded IDs with an atomic file replace"""
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(sorted(self.sent), f)
+        os.replace(tmp_file, self.state_file)
+
+    def schedule(self, todo):
+        """Add a pending todo to the heap, must be called with the condition held"""
+        todo_id = int(todo['id'])
+        if todo_id in self.sent:
+            return
+        try:
+            due = datetime.strptime(f"{todo['due_date']} {todo['due_time']}", "%Y-%m-%d %H:%M")
+        except Exception as e:
+            logger.warning(f"Error parsing date for todo {todo_id}: {e}")
+            return
+        self.pending[todo_id] = todo
+        heapq.heappush(self.heap, (due - self.window, todo_id))
+
+    def on_todo_change(self, event, todo):
+        """TodoManager listener keeping the heap in sync with the todo list"""
+        with self.condition:
+            if event == "reset":
+                self.reschedule()
+            elif event == "added":
+                self.schedule(todo)
+            else:
+                # Heap entries of todos that are no longer pending are skipped when popped
+                self.pending.pop(int(todo['id']), None)
+            self.condition.notify()
+
+    def reschedule(self):
+        """Rebuild the heap from all pending todos, must be called with the condition held"""
+        self.heap = []
+        self.pending = {}
+        for todo in self.todo_manager.get_pending_todos():
+            self.schedule(todo)
+
+    def start(self):
+        """Load pending todos once and start the scheduler thread"""
+        # TodoManager calls listeners with its lock held, so take that one first
+        with self.todo_manager.lock, self.condition:
+            self.reschedule()
+            self.running = True
+        self.thread = threading.Thread(target=self.run, name="reminder-scheduler", daemon=True)
+        self.thread.start()
+        logger.info(f"Reminder scheduler started with {len(self.pending)} pending todos")
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+
+    def pop_due(self, now) -> list:
+        """Pop all todos whose reminder is due, must be called with the condition held"""
+        due_todos = {}
+        while self.heap and self.heap[0][0] <= now:
+            _, todo_id = heapq.heappop(self.heap)
+            if todo_id in self.pending:
+                due_todos[todo_id] = self.pending[todo_id]
+        return list(due_todos.values())
+
+    def run(self):
+        while True:
+            # Changes of other processes only reach the listeners through sync
+            self.todo_manager.sync()
+            with self.condition:
+                if not self.running:
+                    return
+                due_todos = self.pop_due(datetime.now())
+                if not due_todos:
+                    timeout = (self.heap[0][0] - datetime.now()).total_seconds() if self.heap else SYNC_INTERVAL
+                    self.condition.wait(min(timeout, SYNC_INTERVAL))
+                    continue
+
+            sent = self.email_manager.send_reminder(due_todos, wait=True)
+            retry_at = datetime.now() + RETRY_DELAY
+            with self.condition:
+                for todo in due_todos:
+                    todo_id = int(todo['id'])
+                    if sent:
+                        self.pending.pop(todo_id, None)
+                        self.sent.add(todo_id)
+                    elif todo_id in self.pending:
+                        # Try again later, unless the todo was completed or deleted meanwhile
+                        heapq.heappush(self.heap, (retry_at, todo_id))
+                if sent:
+                    try:
+                        self.save_sent()
+                    except Exception as e:
+                        logger.error(f"Error saving reminder state: {e}")
@@ -0,0 +1,114 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+WORD_PATTERN = re.compile(r"\w+")
+# Matches scoring below this share of the query are left out
+MIN_SCORE = 0.1
+
+
+def trigrams(text) -> Counter:
+    """Trigrams of every word in the text, words are padded so short words and word starts count too"""
+    grams = Counter()
+    for word in WORD_PATTERN.findall(str(text).lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams[padded[i:i + 3]] += 1
+    return grams
+
+
+class TodoSearchIndex:
+    """
+    Fuzzy search over the task and description of todos.
+
+    Keeps an inverted trigram index (trigram -> todo IDs) which is built once
+    from the storage and then updated through TodoManager listeners, so a search
+    only touches the todos sharing trigrams with the query. Matches are scored by
+    the IDF-weighted share of the query's trigrams found in the todo, so typos
+    and partial words still match and words that appear in every todo count little.
+    """
+
+    def __init__(self, todo_manager):
+        self.todo_manager = todo_manager
+        self.lock = threading.Lock()
+        self.postings = defaultdict(set)
+        self.todos = {}
+        self.grams = {}
+
+        # TodoManager calls listeners with its lock held, so take that one first
+        with todo_manager.lock, self.lock:
+            todo_manager.add_listener(self.on_todo_change)
+            self.rebuild()
+
+    def rebuild(self):
+        """Index all todos from scratch; must be called with the lock held"""
+        self.postings.clear()
+        self.todos.clear()
+        self.grams.clear()
+        for todo in self.todo_manager.load_todos().to_dict('records'):
+            self.add(todo)
+
+    def add(self, todo):
+        """Index a todo, replacing an older version with the same ID; must be called with the lock held"""
+        todo_id = int(todo['id'])
+        self.remove(todo_id)
+        grams = trigrams(f"{todo.get('task', '')} {todo.get('description', '')}")
+        self.todos[todo_id] = todo
+        self.grams[todo_id] = grams
+        for gram in grams:
+            self.postings[gram].add(todo_id)
+
+    def remove(self, todo_id):
+        """Drop a todo from the index; must be called with the lock held"""
+        self.todos.pop(todo_id, None)
+        for gram in self.grams.pop(todo_id, ()):
+            ids = self.postings[gram]
+            ids.discard(todo_id)
+            if not ids:
+                del self.postings[gram]
+
+    def on_todo_change(self, event, todo):
+        """TodoManager listener keeping the index in sync with the todo list"""
+        if event == "reset":
+            with self.lock:
+                self.rebuild()
+            return
+        todo_id = int(todo['id'])
+        with self.lock:
+            if event == "added":
+                self.add(todo)
+            elif event == "deleted":
+                self.remove(todo_id)
+            elif event == "completed" and todo_id in self.todos:
+                self.todos[todo_id] = {**self.todos[todo_id], "status": "completed"}
+
+    def search(self, query, limit=5, status=None, min_score=MIN_SCORE) -> list:
+        """Return up to `limit` (score, todo) pairs best matching the query, best first"""
+        query_grams = trigrams(query)
+        with self.lock:
+            total = len(self.todos)
+            if not query_grams or not total:
+                return []
+            weights = {gram: math.log(1 + total / len(self.postings[gram])) if gram in self.postings
+                       else math.log(1 + total)
+                       for gram in query_grams}
+            query_weight = sum(weights[gram] * count for gram, count in query_grams.items())
+
+            scores = Counter()
+            for gram, count in query_grams.items():
+                for todo_id in self.postings.get(gram, ()):
+                    scores[todo_id] += weights[gram] * min(count, self.grams[todo_id][gram])
+
+            results = []
+            for todo_id, score in scores.most_common():
+                score = score / query_weight
+                if score < min_score:
+                    break
+                todo = self.todos[todo_id]
+                if status and todo.get('status') != status:
+                    continue
+                results.append((round(score, 3), dict(todo)))
+                if len(results) >= limit:
+                    break
+        return results
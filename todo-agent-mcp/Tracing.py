@@ -0,0 +1,225 @@
+"""
+In-process tracing and metrics.
+
+span("name") times a block of code. Every span is counted in a latency histogram
+per span name, which render_metrics() exports in the Prometheus text format for
+a /metrics endpoint. Inside a trace("request") block the spans are also recorded
+with their parent span and attributes, and the finished trace is kept (the last
+TRACE_HISTORY ones) so it can be returned as JSON by its ID. A trace can be
+continued in another process by passing it the IDs from propagation(), e.g. in
+the metadata of an MCP tool call, and merged back with merge(). Nothing has to run
+besides the process itself; any Prometheus-compatible scraper can read /metrics.
+Set TRACING=off to disable it.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+ENABLED = os.getenv("TRACING", "on").lower() not in ("off", "false", "0", "no")
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "100"))
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+lock = threading.Lock()
+# span name -> [bucket counts..., count, sum]
+histograms = {}
+errors = {}
+counters = {}
+traces = OrderedDict()
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    def __init__(self, name, attributes, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.start_counter = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "spans": list(self.spans),
+        }
+
+
+def observe(name, seconds, error=False):
+    """Add a duration to the histogram of a span name"""
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+        if error:
+            errors[name] = errors.get(name, 0) + 1
+
+
+def count(name, value=1):
+    """Add to a counter, e.g. llm_prompt_tokens"""
+    if not ENABLED:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time the block as a span.
+
+    Yields the attribute dict of the span, so the block can add attributes
+    (e.g. token counts) that are only known at the end.
+    """
+    if not ENABLED:
+        yield attributes
+        return
+    trace = current_trace.get()
+    span_id = uuid.uuid4().hex[:16]
+    parent = current_span.get()
+    token = current_span.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        current_span.reset(token)
+        observe(name, seconds, error is not None)
+        if trace is not None:
+            record = {
+                "span_id": span_id,
+                "parent_id": parent,
+                "name": name,
+                "start_ms": round((start - trace.start_counter) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3),
+                "attributes": attributes,
+            }
+            if error is not None:
+                record["error"] = repr(error)
+            trace.spans.append(record)
+
+
+@contextmanager
+def trace(name, trace_id=None, parent_id=None, **attributes):
+    """
+    Record the spans of the block as a trace, yields the Trace (None when tracing is off).
+
+    trace_id and parent_id continue a trace started in another process (see
+    propagation), blocks with the same trace_id add their spans to one trace.
+    """
+    if not ENABLED:
+        yield None
+        return
+    with lock:
+        new_trace = traces.get(trace_id) if trace_id else None
+    if new_trace is None:
+        new_trace = Trace(name, attributes, trace_id)
+    trace_token = current_trace.set(new_trace)
+    span_token = current_span.set(parent_id)
+    try:
+        with span(name, **attributes):
+            yield new_trace
+    finally:
+        new_trace.duration = time.perf_counter() - new_trace.start_counter
+        current_span.reset(span_token)
+        current_trace.reset(trace_token)
+        with lock:
+            traces[new_trace.id] = new_trace
+            traces.move_to_end(new_trace.id)
+            while len(traces) > TRACE_HISTORY:
+                traces.popitem(last=False)
+
+
+def propagation() -> dict:
+    """IDs of the current trace and span, for continuing the trace in another process"""
+    trace = current_trace.get()
+    if trace is None:
+        return {}
+    return {"trace_id": trace.id, "span_id": current_span.get()}
+
+
+def merge(recorded, other) -> dict:
+    """Add the spans of the same trace recorded by another process, both as dicts from get_trace"""
+    offset = (other["start"] - recorded["start"]) * 1000
+    spans = recorded["spans"] + [{**span, "start_ms": round(span["start_ms"] + offset, 3)}
+                                 for span in other["spans"]]
+    return {**recorded, "spans": sorted(spans, key=lambda span: span["start_ms"])}
+
+
+def get_trace(trace_id):
+    """A recent trace as a dict, None if unknown"""
+    with lock:
+        recorded = traces.get(trace_id)
+    return recorded.to_dict() if recorded is not None else None
+
+
+def recent_traces() -> list:
+    """Summaries of the recent traces, newest first"""
+    with lock:
+        recorded = list(traces.values())
+    return [{"trace_id": t.id, "name": t.name, "start": t.start, "spans": len(t.spans),
+             "duration_ms": round(t.duration * 1000, 3) if t.duration is not None else None}
+            for t in reversed(recorded)]
+
+
+def label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(prefix="todo_agent") -> str:
+    """All histograms and counters in the Prometheus text exposition format"""
+    with lock:
+        snapshot = {name: list(values) for name, values in histograms.items()}
+        error_counts = dict(errors)
+        counter_values = dict(counters)
+
+    lines = [f"# HELP {prefix}_span_duration_seconds Duration of traced operations",
+             f"# TYPE {prefix}_span_duration_seconds histogram"]
+    for name, histogram in sorted(snapshot.items()):
+        span_label = f'span="{label(name)}"'
+        for bound, bucket_count in zip(BUCKETS, histogram):
+            lines.append(f'{prefix}_span_duration_seconds_bucket{{{span_label},le="{bound}"}} {bucket_count}')
+        lines.append(f'{prefix}_span_duration_seconds_bucket{{{span_label},le="+Inf"}} {histogram[-2]}')
+        lines.append(f"{prefix}_span_duration_seconds_count{{{span_label}}} {histogram[-2]}")
+        lines.append(f"{prefix}_span_duration_seconds_sum{{{span_label}}} {histogram[-1]:.6f}")
+
+    lines += [f"# HELP {prefix}_span_errors_total Traced operations which raised an exception",
+              f"# TYPE {prefix}_span_errors_total counter"]
+    for name, error_count in sorted(error_counts.items()):
+        lines.append(f'{prefix}_span_errors_total{{span="{label(name)}"}} {error_count}')
+
+    for name, value in sorted(counter_values.items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop all recorded metrics and traces"""
+    with lock:
+        histograms.clear()
+        errors.clear()
+        counters.clear()
+        traces.clear()
@@ -0,0 +1,76 @@
+"""
+Latency of common commands with and without the intent fast-path router.
+
+Runs each message through mcp_client.run once via the router and once through
+the full ReAct agent (router disabled), with the response cache disabled.
+The MCP server and Ollama must be running:
+    python mcp_server.py --no_reminders
+    python bench_intents.py http://<ollama-url> <model-name> --repeat 3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import mcp_client
+from IntentRouter import IntentRouter
+from ResponseCache import ResponseCache
+
+MESSAGES = [
+    "list todos",
+    "list pending todos",
+    "show completed tasks",
+    "show upcoming tasks",
+    "find task groceries",
+    # IDs that don't exist, so the benchmark doesn't change the todo list
+    "complete 999999",
+    "delete task 999999",
+]
+
+
+async def measure(agent, msg: str, repeat: int) -> float:
+    """Median seconds of mcp_client.run for the message"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await mcp_client.run(agent, msg)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the intent fast-path router")
+    parser.add_argument("llm_url", help="Ollama URL, e.g. http://localhost:11434")
+    parser.add_argument("model", help="Ollama model name")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per message and path")
+    args = parser.parse_args()
+
+    agent = await mcp_client.setup_agent(args.llm_url, args.model)
+    mcp_client.response_cache = ResponseCache(max_entries=0)
+    router = IntentRouter(enabled="all")
+    no_router = IntentRouter(enabled="off")
+
+    # Warm up the MCP connection and the server's search index
+    mcp_client.intent_router = IntentRouter(enabled="all")
+    for msg in MESSAGES:
+        await mcp_client.run(agent, msg)
+
+    print(f"{'message':<24} {'router':>10} {'agent':>10} {'speedup':>8}")
+    routed_total = agent_total = 0.0
+    for msg in MESSAGES:
+        mcp_client.intent_router = router
+        routed = await measure(agent, msg, args.repeat)
+        mcp_client.intent_router = no_router
+        full = await measure(agent, msg, args.repeat)
+        routed_total += routed
+        agent_total += full
+        print(f"{msg:<24} {routed * 1000:>8.1f}ms {full * 1000:>8.1f}ms {full / routed:>7.1f}x")
+
+    print(f"{'total':<24} {routed_total * 1000:>8.1f}ms {agent_total * 1000:>8.1f}ms "
+          f"{agent_total / routed_total:>7.1f}x")
+    print(f"Router hit rate: {router.stats()['hit_rate']:.0%}")
+    await mcp_client.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
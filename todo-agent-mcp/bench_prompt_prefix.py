@@ -0,0 +1,123 @@
+"""
+Prompt-eval time of repeated turns with different prompt layouts.
+
+    old:     user message first, system prompt with the date after it (previous layout)
+    stable:  stable system prompt first, date in a context block after the message
+    session: like stable, with the earlier turns of the session sent as prefix
+
+Ollama only evaluates the part of the prompt that differs from the previous
+request, so a stable prefix shows up as fewer evaluated prompt tokens and a
+shorter prompt_eval_duration from the second turn on. Ollama must be running:
+    python bench_prompt_prefix.py http://<ollama-url> <model-name> --turns 5
+"""
+import argparse
+import asyncio
+import statistics
+from datetime import datetime
+
+from direct_ollama_call import MyOllama
+from ollama_client import keep_alive, warm_up
+from ResponseCache import ResponseCache
+
+QUESTIONS = [
+    "What can you help me with?",
+    "How should I phrase a new todo?",
+    "What happens when a todo is due soon?",
+    "Can you list my completed todos?",
+    "How do I delete a todo?",
+    "What date format do you use?",
+]
+
+
+# System prompt of the previous layout, as it was before the date moved to the context block: the date
+# (without time) was filled in when the module was imported, so it stayed the same for the whole process
+OLD_SYSTEM_PROMPT = (
+    """You are a helpful to-do assistant. Today is """ + datetime.now().strftime("%B %d, %Y") + """.
+
+{tools}
+
+When processing user requests, please follow these guidelines:
+
+1. Always think step-by-step about what the user is asking
+2. Use the provided tools to perform actions as needed. If there is no tool matching for the request, just respond as a chatbot. !!Important: Do not make up any tool
+3. After each action, provide a clear response to the user
+4. If the user provided a date but without a year, DO NOT ASSUME THE YEAR!. Instead, add current year to the date
+5. If the user mentions relative dates like "next week" or "in 3 days", convert them to specific dates based on the current date
+6. If the user did not provide a due time when adding a todo, assume it's due by the end of the day (23:59)
+7. Always check for upcoming todos after each action but when calling the tool pass "False" as parameter so no response is returned.
+Also do not mention this in your response to the user.
+8. If the user did not provide todo id then get all todos and pick the one that best matches the user's request, the continue with the respective action
+9. If the user did not provide a status when listing todos then list all todos
+10. If the user did not provide a due date when adding a todo then assume it's due today
+11. IMPORTANT: Do not include thinking steps in your final answer to the user
+
+Use the following format for your reasoning process:
+Question: {input}
+Thought: you should always think about what to do
+Action: the action to take if request matches with any of these tools [{tool_names}]. If no action matches then respond to the user as a chatbot
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought: """
+)
+
+
+async def run_old_layout(llm: MyOllama, question: str) -> dict:
+    """Previous layout: user message first, then the system prompt with the date"""
+    response = await llm.ollama_client.chat(
+        model=llm.model,
+        messages=[{"role": "user", "content": question}, {"role": "system", "content": OLD_SYSTEM_PROMPT}],
+        stream=False,
+        think=True,
+        keep_alive=keep_alive(),
+        options={"temperature": 0.7},
+    )
+    return {"prompt_eval_count": response.prompt_eval_count, "prompt_eval_duration": response.prompt_eval_duration}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark of prompt prefix reuse")
+    parser.add_argument("llm_url", help="Ollama URL, e.g. http://localhost:11434")
+    parser.add_argument("model", help="Ollama model name")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per layout")
+    args = parser.parse_args()
+
+    await warm_up(args.llm_url, args.model)
+    llm = MyOllama(ollama_host=args.llm_url, model=args.model, cache=ResponseCache(max_entries=0))
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.turns)]
+
+    async def stable(question):
+        await llm.run(question)
+        return llm.last_stats
+
+    async def session(question):
+        await llm.run(question, session_id="bench")
+        return llm.last_stats
+
+    layouts = [
+        ("old", lambda question: run_old_layout(llm, question)),
+        ("stable", stable),
+        ("session", session),
+    ]
+
+    print(f"{'layout':<8} {'turn':>4} {'prompt tokens':>14} {'prompt eval':>12}")
+    for name, run_turn in layouts:
+        durations = []
+        for turn, question in enumerate(questions, start=1):
+            stats = await run_turn(question)
+            duration = (stats.get("prompt_eval_duration") or 0) / 1e6
+            if turn > 1:
+                durations.append(duration)
+            print(f"{name:<8} {turn:>4} {stats.get('prompt_eval_count') or 0:>14} {duration:>10.1f}ms")
+        if durations:
+            print(f"{name:<8} median prompt eval of repeated turns: {statistics.median(durations):.1f}ms\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,633 @@
+"""
+End-to-end benchmark suite, runs without Ollama or a mail server.
+
+Scenarios:
+    crud   TodoManager operations (add, list, search, complete, delete,
+           get_upcoming_todos) on synthetic todo lists of each --sizes
+    mcp    MCP tool round-trips over SSE against mcp_server.py, for each size
+    agent  /call-agent throughput of the web server, with the MCP server and a
+           deterministic fake Ollama which answers with scripted ReAct steps
+    email  EmailManager sending to a local SMTP sink
+
+Every scenario reports p50/p99 latency, throughput and the peak RSS of the
+process doing the work (a fresh process per crud/email run, the server
+processes for mcp/agent). Results are saved as JSON, so runs on different
+commits can be compared:
+    python bench_suite.py run --sizes 1000,100000,1000000
+    python bench_suite.py run --scenarios crud,mcp --sizes 1000 --output before.json
+    python bench_suite.py compare before.json after.json --threshold 10
+
+The fake Ollama server and the SMTP sink can also be started on their own,
+e.g. to try the web server without a model:
+    python bench_suite.py fake-ollama --port 11435
+    python bench_suite.py smtp-sink --port 2525
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from load_test import percentile, run_client
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = "1000,100000,1000000"
+DEFAULT_SCENARIOS = "crud,mcp,agent,email"
+SEED = 42
+WORDS = ["report", "groceries", "dentist", "invoice", "meeting", "flight", "gym", "taxes", "birthday", "laundry"]
+# MCP tool calls of the mcp scenario
+MCP_CALLS = [
+    ("list_all_todos", {"status": "pending", "limit": 20}),
+    ("search_todos", {"query": "invoice meeting", "limit": 5}),
+    ("get_current_date", {}),
+]
+# Scripted answers of the fake Ollama server: one tool call, then the final answer
+REACT_ACTION = ('Thought: I need to list the pending todos.\n'
+                'Action: list_all_todos\n'
+                'Action Input: {"status": "pending", "limit": 5}\n')
+REACT_ANSWER = 'Thought: I can answer without using any more tools.\nAnswer: Here are your pending todos.'
+
+
+# --- Synthetic data -------------------------------------------------------
+
+def generate_dataset(rows: int, path: str, seed: int = SEED):
+    """Write a todo CSV with `rows` todos, due dates spread from 30 days ago to 60 days ahead"""
+    rng = np.random.default_rng(seed + rows)
+    ids = np.arange(1, rows + 1)
+    words = np.array(WORDS)
+    first = words[rng.integers(0, len(WORDS), rows)]
+    second = words[rng.integers(0, len(WORDS), rows)]
+    today = pd.Timestamp(datetime.now().date())
+    due = today + pd.to_timedelta(rng.integers(-30, 61, rows), unit="D")
+    df = pd.DataFrame({
+        "id": ids,
+        "task": pd.Series(first) + " " + pd.Series(second) + " #" + pd.Series(ids).astype(str),
+        "description": "Synthetic todo about " + pd.Series(first),
+        "due_date": due.strftime("%Y-%m-%d"),
+        "due_time": pd.Series(rng.integers(0, 24, rows)).map("{:02d}:00".format),
+        "status": np.where(rng.random(rows) < 0.7, "pending", "completed"),
+        "created_at": (today - pd.Timedelta(days=90)).strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    df.to_csv(path, index=False)
+
+
+# --- Measurement helpers --------------------------------------------------
+
+def summarize(scenario: str, operation: str, latencies: list, elapsed: float = None, size: int = None,
+              peak_rss_mb: float = None, errors: int = 0) -> dict:
+    """Result entry of one operation; without `elapsed` the calls ran one after another"""
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    return {
+        "scenario": scenario,
+        "operation": operation,
+        "size": size,
+        "samples": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else None,
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def own_peak_rss_mb():
+    """Peak RSS of this process, None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def process_peak_rss_mb(pid: int):
+    """Peak RSS of another process from /proc, None if it can't be read (not Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_url(url: str, process: subprocess.Popen, timeout: float = 120):
+    """Poll the URL until it answers, raise if the process exits or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} didn't answer within {timeout} seconds")
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_isolated(fn, *args) -> list:
+    """Run a scenario function in a fresh process, so its peak RSS isn't inflated by earlier scenarios"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+# --- Fake Ollama and SMTP sink --------------------------------------------
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Deterministic Ollama stand-in.
+
+    /api/chat answers with a ReAct tool call, or with the final answer once the
+    conversation has an observation; /api/generate returns an empty response
+    (model warm-up). Token counts are derived from the text lengths, so the
+    numbers are the same on every run.
+    """
+    delay = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.delay:
+            time.sleep(self.delay)
+        if self.path != "/api/chat":
+            self.send_json({"model": body.get("model", ""), "created_at": "2025-01-01T00:00:00Z",
+                            "response": "", "done": True})
+            return
+
+        messages = body.get("messages", [])
+        observed = any(str(m.get("content", "")).startswith("Observation:") for m in messages)
+        text = REACT_ANSWER if observed else REACT_ACTION
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        generated_tokens = max(1, len(text) // 4)
+        final = {
+            "model": body.get("model", ""), "created_at": "2025-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": "" if body.get("stream") else text},
+            "done": True, "done_reason": "stop",
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": prompt_tokens * 200_000,
+            "eval_count": generated_tokens, "eval_duration": generated_tokens * 20_000_000,
+        }
+        if not body.get("stream"):
+            self.send_json(final)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i in range(0, len(text), 16):
+            chunk = {"model": final["model"], "created_at": final["created_at"],
+                     "message": {"role": "assistant", "content": text[i:i + 16]}, "done": False}
+            self.wfile.write((json.dumps(chunk) + "\n").encode())
+        self.wfile.write((json.dumps(final) + "\n").encode())
+
+    def send_json(self, data):
+        payload = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server side which accepts and drops every message"""
+
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 bench-smtp-sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 bench-smtp-sink")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 OK")
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), SmtpSinkHandler)
+        self.lock = threading.Lock()
+        self.received = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+
+def sink_env(port: int) -> dict:
+    """EmailManager settings sending to the SMTP sink"""
+    return {"EMAIL_HOST": "127.0.0.1", "EMAIL_PORT": str(port), "EMAIL_USE_SSL": "false",
+            "EMAIL_USER": "", "EMAIL_PASSWORD": "", "EMAIL_FROM": "bench@example.com",
+            "EMAIL_TO": "bench@example.com"}
+
+
+# --- Scenarios ------------------------------------------------------------
+
+def crud_scenario(csv_file: str, size: int, iterations: int) -> list:
+    """TodoManager operations on a copy of a dataset, runs in its own process"""
+    from TodoManager import TodoManager
+
+    rng = random.Random(SEED)
+    picked = rng.sample(range(1, size + 1), min(size, 2 * iterations))
+    complete_ids, delete_ids = picked[:len(picked) // 2], picked[len(picked) // 2:]
+    due_date = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+
+    latencies = {}
+    todo_manager = None
+
+    def create():
+        nonlocal todo_manager
+        todo_manager = TodoManager(csv_file=csv_file)
+        todo_manager.storage.count()
+
+    latencies["load"] = [timed(create)]
+    operations = [
+        ("add_todo", lambda i: todo_manager.add_todo(f"bench task {i}", "added by the benchmark", due_date, "12:00")),
+        ("list_todos", lambda i: todo_manager.list_todos(status="pending", limit=20)),
+        ("search_todos", lambda i: todo_manager.search_todos(f"{WORDS[i % len(WORDS)]} meeting", limit=5)),
+        ("get_upcoming_todos", lambda i: todo_manager.get_upcoming_todos(24)),
+        ("complete_todo", lambda i: todo_manager.complete_todo(complete_ids[i % len(complete_ids)])),
+        ("delete_todo", lambda i: todo_manager.delete_todo(delete_ids[i % len(delete_ids)])),
+    ]
+    for name, operation in operations:
+        latencies[name] = [timed(operation, i) for i in range(iterations)]
+    # Flushes the log and writes the whole table as a new snapshot
+    latencies["close"] = [timed(todo_manager.close)]
+
+    peak_rss = own_peak_rss_mb()
+    return [summarize("crud", name, values, size=size, peak_rss_mb=peak_rss) for name, values in latencies.items()]
+
+
+def email_scenario(iterations: int) -> list:
+    """EmailManager against the SMTP sink, runs in its own process"""
+    sink = SmtpSink().start()
+    os.environ.update(sink_env(sink.port))
+    from EmailManager import EmailManager
+
+    email_manager = EmailManager()
+    try:
+        # One email at a time, waiting until it was handed to the server
+        send_wait = []
+        failed = 0
+        for i in range(iterations):
+            start = time.perf_counter()
+            failed += not email_manager.send_email("Bench", f"Message {i}", wait=True)
+            send_wait.append(time.perf_counter() - start)
+        # A burst of queued emails, sent in batches over the same connection
+        burst = []
+        start = time.perf_counter()
+        for i in range(iterations):
+            burst_start = time.perf_counter()
+            email_manager.send_email("Bench burst", f"Message {i}")
+            burst.append(time.perf_counter() - burst_start)
+        email_manager.flush()
+        burst_elapsed = time.perf_counter() - start
+    finally:
+        email_manager.stop()
+        sink.shutdown()
+
+    peak_rss = own_peak_rss_mb()
+    return [
+        summarize("email", "send_wait", send_wait, peak_rss_mb=peak_rss, errors=failed),
+        # Emails of the burst the sink didn't receive
+        summarize("email", "send_burst", burst, elapsed=burst_elapsed, peak_rss_mb=peak_rss,
+                  errors=max(0, 2 * iterations - failed - sink.received)),
+    ]
+
+
+def start_mcp_server(workdir: str, env: dict) -> tuple:
+    """Start mcp_server.py with its todos in `workdir`, returns the process and the SSE URL"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_DIR, "mcp_server.py"), "--port", str(port), "--no_reminders"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    wait_for_url(f"http://127.0.0.1:{port}/metrics", process)
+    return process, f"http://127.0.0.1:{port}/sse"
+
+
+async def measure_tool(url: str, tool: str, arguments: dict, clients: int, calls: int) -> tuple:
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(url, tool, arguments, calls, latencies) for _ in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def mcp_scenario(dataset: str, size: int, clients: int, calls: int, env: dict) -> list:
+    """MCP tool round-trips over SSE from `clients` sessions at the same time"""
+    with tempfile.TemporaryDirectory(prefix="bench-mcp-") as workdir:
+        shutil.copy(dataset, os.path.join(workdir, "todos.csv"))
+        process, url = start_mcp_server(workdir, env)
+        try:
+            results = []
+            for tool, arguments in MCP_CALLS:
+                # Not measured: loads the todos and builds the search index
+                asyncio.run(measure_tool(url, tool, arguments, 1, 1))
+                latencies, elapsed = asyncio.run(measure_tool(url, tool, arguments, clients, calls))
+                results.append(summarize("mcp", tool, latencies, elapsed=elapsed, size=size,
+                                         peak_rss_mb=process_peak_rss_mb(process.pid)))
+            return results
+        finally:
+            stop_process(process)
+
+
+def call_agent(url: str, msg: str) -> bool:
+    """POST one message to /call-agent, returns whether the agent answered"""
+    request = urllib.request.Request(url, data=json.dumps({"msg": msg}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return "response" in json.loads(response.read())
+    except OSError:
+        return False
+
+
+def agent_scenario(dataset: str, size: int, clients: int, requests: int, env: dict) -> list:
+    """/call-agent throughput with the fake Ollama server behind the agent"""
+    ollama_port = free_port()
+    web_port = free_port()
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="bench-agent-") as workdir:
+        shutil.copy(dataset, os.path.join(workdir, "todos.csv"))
+        try:
+            ollama = subprocess.Popen([sys.executable, os.path.abspath(__file__), "fake-ollama", "--port", str(ollama_port)],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            processes.append(ollama)
+            mcp_server, mcp_url = start_mcp_server(workdir, env)
+            processes.append(mcp_server)
+
+            web_env = dict(env, OLLAMA_URL=f"http://127.0.0.1:{ollama_port}", OLLAMA_MODEL="bench", MCP_URL=mcp_url,
+                           # Every request goes through the full agent
+                           LLM_CACHE_SIZE="0", INTENT_ROUTER="off",
+                           AGENT_CONCURRENCY=str(clients), AGENT_QUEUE_SIZE=str(requests))
+            web = subprocess.Popen([sys.executable, "-m", "hypercorn", "main:app", "--bind", f"127.0.0.1:{web_port}"],
+                                   cwd=PROJECT_DIR, env=web_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            processes.append(web)
+            wait_for_url(f"http://127.0.0.1:{web_port}/", web)
+
+            url = f"http://127.0.0.1:{web_port}/call-agent"
+            call_agent(url, "What is still pending?")
+            latencies = []
+            errors = 0
+
+            def one(i):
+                start = time.perf_counter()
+                ok = call_agent(url, f"What is still pending? ({i})")
+                return time.perf_counter() - start, ok
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                for latency, ok in pool.map(one, range(requests)):
+                    latencies.append(latency)
+                    errors += not ok
+            elapsed = time.perf_counter() - start
+
+            # Web server plus MCP server, the fake Ollama isn't part of the application
+            peaks = [process_peak_rss_mb(p.pid) for p in (web, mcp_server)]
+            peak_rss = round(sum(peaks), 1) if None not in peaks else None
+            return [summarize("agent", "call-agent", latencies, elapsed=elapsed, size=size,
+                              peak_rss_mb=peak_rss, errors=errors)]
+        finally:
+            for process in reversed(processes):
+                stop_process(process)
+
+
+# --- Running and comparing ------------------------------------------------
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: list):
+    print(f"{'scenario':<8} {'operation':<20} {'size':>8} {'n':>5} {'p50 ms':>10} {'p99 ms':>10} "
+          f"{'ops/s':>10} {'peak MB':>8} {'errors':>6}")
+    for r in results:
+        print(f"{r['scenario']:<8} {r['operation']:<20} {r['size'] or '':>8} {r['samples']:>5} "
+              f"{r['p50_ms'] or 0:>10.2f} {r['p99_ms'] or 0:>10.2f} {r['throughput_per_s'] or 0:>10.1f} "
+              f"{r['peak_rss_mb'] or 0:>8.1f} {r['errors']:>6}")
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(DEFAULT_SCENARIOS.split(","))
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    sink = SmtpSink().start()
+    # The servers send any email to the sink and always use the CSV storage
+    env = dict(os.environ, TODO_STORAGE="csv", **sink_env(sink.port))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-data-") as data_dir:
+        datasets = {}
+        for size in sorted(set(sizes) | ({min(sizes)} if "agent" in scenarios else set())):
+            datasets[size] = os.path.join(data_dir, f"todos_{size}.csv")
+            print(f"Generating {size} todos...")
+            generate_dataset(size, datasets[size])
+
+        for size in sizes:
+            if "crud" in scenarios:
+                print(f"crud, {size} todos...")
+                with tempfile.TemporaryDirectory(prefix="bench-crud-") as workdir:
+                    csv_file = shutil.copy(datasets[size], os.path.join(workdir, "todos.csv"))
+                    results += run_isolated(crud_scenario, csv_file, size, args.iterations)
+            if "mcp" in scenarios:
+                print(f"mcp, {size} todos...")
+                results += mcp_scenario(datasets[size], size, args.clients, args.calls, env)
+        if "agent" in scenarios:
+            print(f"agent, {min(sizes)} todos...")
+            results += agent_scenario(datasets[min(sizes)], min(sizes), args.clients, args.requests, env)
+        if "email" in scenarios:
+            print("email...")
+            results += run_isolated(email_scenario, args.iterations)
+    sink.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"sizes": sizes, "scenarios": scenarios, "iterations": args.iterations,
+                     "clients": args.clients, "calls": args.calls, "requests": args.requests},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        PROJECT_DIR, "bench_results", f"{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print_results(results)
+    print(f"\nResults saved to {output}")
+
+
+def compare(args) -> int:
+    """Print the change of every operation between two result files, returns 1 if anything regressed"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    def key(r):
+        return r["scenario"], r["operation"], r["size"]
+
+    before = {key(r): r for r in baseline["results"]}
+    print(f"Baseline {baseline.get('commit')} ({baseline.get('timestamp')}), "
+          f"current {current.get('commit')} ({current.get('timestamp')})")
+    print(f"{'scenario':<8} {'operation':<20} {'size':>8} {'p50':>9} {'p99':>9} {'ops/s':>9} {'peak MB':>9}")
+
+    def change(old, new):
+        if not old or new is None:
+            return None
+        return (new - old) / old * 100
+
+    def cell(value, worse):
+        if value is None:
+            return f"{'-':>9}"
+        return f"{value:>+8.1f}%" + ("!" if worse else " ")
+
+    regressions = 0
+    for r in current["results"]:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        p50 = change(old["p50_ms"], r["p50_ms"])
+        p99 = change(old["p99_ms"], r["p99_ms"])
+        throughput = change(old["throughput_per_s"], r["throughput_per_s"])
+        rss = change(old["peak_rss_mb"], r["peak_rss_mb"])
+        # Higher latency and memory or lower throughput beyond the threshold count as a regression
+        worse = [p50 is not None and p50 > args.threshold,
+                 p99 is not None and p99 > args.threshold,
+                 throughput is not None and throughput < -args.threshold,
+                 rss is not None and rss > args.threshold]
+        regressions += any(worse)
+        print(f"{r['scenario']:<8} {r['operation']:<20} {r['size'] or '':>8} "
+              f"{cell(p50, worse[0])}{cell(p99, worse[1])}{cell(throughput, worse[2])}{cell(rss, worse[3])}")
+
+    print(f"\n{regressions} operation(s) regressed by more than {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite of the todo agent")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Todo list sizes (default: {DEFAULT_SIZES})")
+    run_parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS,
+                            help=f"Scenarios to run (default: {DEFAULT_SCENARIOS})")
+    run_parser.add_argument("--iterations", type=int, default=50, help="Calls per operation of crud and email")
+    run_parser.add_argument("--clients", type=int, default=4, help="Simultaneous clients of mcp and agent")
+    run_parser.add_argument("--calls", type=int, default=25, help="Tool calls per client and tool of mcp")
+    run_parser.add_argument("--requests", type=int, default=40, help="Total /call-agent requests of agent")
+    run_parser.add_argument("--output", help="Result file (default: bench_results/<time>-<commit>.json)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", help="Result file of the earlier run")
+    compare_parser.add_argument("current", help="Result file of the new run")
+    compare_parser.add_argument("--threshold", type=float, default=10,
+                                help="Change in percent counted as a regression (default: 10)")
+
+    ollama_parser = commands.add_parser("fake-ollama", help="Run the deterministic fake Ollama server")
+    ollama_parser.add_argument("--port", type=int, default=11435)
+    ollama_parser.add_argument("--delay", type=float, default=0, help="Seconds added to every response")
+
+    sink_parser = commands.add_parser("smtp-sink", help="Run the SMTP sink")
+    sink_parser.add_argument("--port", type=int, default=2525)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        sys.exit(compare(args))
+    elif args.command == "fake-ollama":
+        FakeOllamaHandler.delay = args.delay
+        print(f"Fake Ollama listening on http://127.0.0.1:{args.port}")
+        ThreadingHTTPServer(("127.0.0.1", args.port), FakeOllamaHandler).serve_forever()
+    elif args.command == "smtp-sink":
+        sink = SmtpSink(args.port)
+        print(f"SMTP sink listening on 127.0.0.1:{args.port}")
+        sink.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
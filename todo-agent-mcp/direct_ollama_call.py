@@ -1,46 +1,88 @@
-import ollama
+from prompt_templates import context_block
 from prompt_templates2 import TODO_AGENT_PROMPT
+from ResponseCache import ResponseCache
+from SessionStore import SessionStore
+from ollama_client import get_async_client, keep_alive, warm_up
 
-class MyOllama:
-    def __init__(self, ollama_host: str, model: str):
-        # Configure ollama client with custom host if needed
+# Shared by all MyOllama instances
+response_cache = ResponseCache()
+# One MyOllama per (host, model), created and warmed up by main() on first use
+instances = {}
 
-        self.ollama_client = ollama.Client(host=ollama_host)
+class MyOllama:
+    def __init__(self, ollama_host: str, model: str, cache: ResponseCache = None, sessions: SessionStore = None):
+        # Shared async client for the host, its HTTP connections are reused across requests
+        self.ollama_client = get_async_client(ollama_host)
         self.model = model
         self.ollama_host = ollama_host
         self.supports_tools = None  # Will be determined on first use
+        self.cache = cache if cache is not None else response_cache
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.last_stats = {}
 
         print(f"Using Ollama server at: {self.ollama_host}")
 
 
-    async def run(self, user_message: str):
-        """Process a single user message with system prompt"""
-        messages = [
-            {"role": "user", "content": user_message},
-            {"role": "system", "content": TODO_AGENT_PROMPT.template}
-        ]
+    async def run(self, user_message: str, session_id: str = None):
+        """
+        Process a single user message with system prompt.
+
+        The system prompt always comes first and never changes, and the date is
+        appended after the user's message, so consecutive requests share the same
+        prompt prefix and Ollama reuses its KV cache for it. With a session_id the
+        earlier turns of the session are sent unchanged before the new message, so
+        the whole conversation so far is reused as prefix until its oldest turns
+        are summarized (see SessionStore).
+        Repeated messages outside of a session are answered from the cache.
+        """
+        key = None
+        if session_id is None:
+            # Without tools the answer doesn't depend on the todo list, so the state version is fixed
+            key = self.cache.make_key(self.model, TODO_AGENT_PROMPT.template, user_message, 0)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        history = self.sessions.messages(session_id)
+        user_turn = {"role": "user", "content": user_message + context_block()}
+        messages = [{"role": "system", "content": TODO_AGENT_PROMPT.template}] + history + [user_turn]
 
         # Use ollama.chat for conversation-style interaction
-        response = self.ollama_client.chat(
+        response = await self.ollama_client.chat(
             model=self.model,
             messages=messages,
             stream=False,
             think=True,
+            keep_alive=keep_alive(),
             options={
                 "temperature": 0.7
             }
         )
 
-        final_answer = response['message']['content']
+        self.last_stats = {
+            name: getattr(response, name, None)
+            for name in ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "total_duration")
+        }
+
+        content = response['message']['content']
+        # Keep the turn exactly as sent and generated, so the next request starts with the same prefix
+        self.sessions.add_turn(session_id, user_turn["content"], content)
+
+        final_answer = content
         parts = final_answer.split("Final Answer:", 1)  # Split only on first occurrence
         if len(parts) > 1:
             final_answer =  parts[1]
 
+        self.cache.put(key, final_answer)
         return final_answer
 
 
 async def main(llm_url: str, model: str):
-    print("Setting up clean LLM...")
-    llm = MyOllama(ollama_host=llm_url, model=model)
-    print("Ready!")
+    llm = instances.get((llm_url, model))
+    if llm is None:
+        print("Setting up clean LLM...")
+        llm = MyOllama(ollama_host=llm_url, model=model)
+        await warm_up(llm_url, model)
+        instances[(llm_url, model)] = llm
+        print("Ready!")
     return llm
@@ -24,6 +24,13 @@ const MessageList = ({ messages, isLoading }) => {
           className={`message ${message.sender === 'user' ? 'user-message' : 'bot-message'}`}
         >
           <div className="message-content">
+            {message.steps && message.steps.length > 0 && (
+              <div className="message-steps">
+                {message.steps.map((step, index) => (
+                  <div key={index}>{step}</div>
+                ))}
+              </div>
+            )}
             <div className="message-text">{message.text}</div>
             <div className="message-time">{formatTime(message.timestamp)}</div>
           </div>
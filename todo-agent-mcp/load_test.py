@@ -0,0 +1,69 @@
+"""
+Load test for the MCP ToDo server.
+
+Opens N MCP sessions at the same time and lets each of them call a tool
+repeatedly, then prints throughput and latency percentiles.
+
+Start the server first (`python mcp_server.py --no_reminders`), then run e.g.:
+    python load_test.py --clients 1 --calls 50
+    python load_test.py --clients 16 --calls 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+DEFAULT_URL = "http://127.0.0.1:3001/sse"
+
+
+async def run_client(url: str, tool: str, arguments: dict, calls: int, latencies: list):
+    """Open one MCP session and call the tool `calls` times"""
+    async with sse_client(url) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            for _ in range(calls):
+                start = time.perf_counter()
+                result = await session.call_tool(tool, arguments)
+                latencies.append(time.perf_counter() - start)
+                if result.isError:
+                    raise RuntimeError(f"Tool call failed: {result.content}")
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test for the MCP ToDo server")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"MCP SSE endpoint (default: {DEFAULT_URL})")
+    parser.add_argument("--clients", type=int, default=8, help="Number of simultaneous MCP sessions")
+    parser.add_argument("--calls", type=int, default=50, help="Tool calls per session")
+    parser.add_argument("--tool", default="list_all_todos", help="Tool to call")
+    parser.add_argument("--arguments", default="{}", help="Tool arguments as JSON")
+    args = parser.parse_args()
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(args.url, args.tool, json.loads(args.arguments), args.calls, latencies)
+        for _ in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    print(f"Clients:    {args.clients}")
+    print(f"Calls:      {len(latencies)} x {args.tool}")
+    print(f"Elapsed:    {elapsed:.2f} s")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} calls/s")
+    print(f"Latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
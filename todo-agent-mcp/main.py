@@ -1,12 +1,22 @@
-from quart import Quart, request, jsonify
+from quart import Quart, Response, request, jsonify
 import mcp_client
 import direct_ollama_call
+from AgentQueue import AgentQueue, AgentQueueFull
+import Tracing
+import argparse
+import json
+import os
 import sys
 
 app = Quart(__name__)
+# Streamed agent responses can take longer than Quart's default 60 seconds
+app.config["RESPONSE_TIMEOUT"] = None
 
-ollama_host = ""
-model = ""
+# Set from the command line, or from OLLAMA_URL and OLLAMA_MODEL when started by hypercorn
+ollama_host = os.environ.get("OLLAMA_URL", "")
+model = os.environ.get("OLLAMA_MODEL", "")
+# Limits concurrent agent runs, see AgentQueue
+agent_queue = AgentQueue()
 
 # Enable CORS manually
 @app.after_request
@@ -16,10 +26,76 @@ async def after_request(response):
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
     return response
 
+@app.before_serving
+async def startup():
+    # Connect to the MCP server, fetch the tools and create the LLM client and agent once
+    try:
+        await mcp_client.main(ollama_host, model)
+    except Exception as e:
+        print(f"Agent setup failed, it will be retried on the first request: {e}")
+
+@app.after_serving
+async def shutdown():
+    await mcp_client.shutdown()
+
+def sse_event(event: dict) -> str:
+    """Format an event dict as a Server-Sent Events message"""
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+def busy_response(e: AgentQueueFull):
+    """429 response asking the client to retry later"""
+    response = jsonify({"error": "Server busy", "message": str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/', methods=['GET'])
 def home():
     return "nothing to see here, move along"
 
+@app.route('/cache-stats', methods=['GET'])
+async def cache_stats():
+    """Hit/miss counters of the agent response cache"""
+    return jsonify(mcp_client.response_cache.stats())
+
+@app.route('/intent-stats', methods=['GET'])
+async def intent_stats():
+    """Hit counters of the intent fast-path router"""
+    return jsonify(mcp_client.intent_router.stats())
+
+@app.route('/session-stats', methods=['GET'])
+async def session_stats():
+    """Counters of the conversation session store"""
+    return jsonify(mcp_client.session_store.stats())
+
+@app.route('/queue-stats', methods=['GET'])
+async def queue_stats():
+    """Running/waiting/rejected counters of the agent queue"""
+    return jsonify(agent_queue.stats())
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Span timings and token counters in the Prometheus text format"""
+    return Response(Tracing.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces', methods=['GET'])
+async def traces():
+    """The most recent request traces, newest first"""
+    return jsonify(Tracing.recent_traces())
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+async def trace_detail(trace_id):
+    """All spans of a recent request, trace_id is returned by /call-agent"""
+    recorded = Tracing.get_trace(trace_id)
+    if recorded is None:
+        return jsonify({"error": "Unknown trace", "message": f"No recent trace {trace_id}"}), 404
+    # Tool calls and their storage work are recorded by the MCP server under the same trace
+    if mcp_client.mcp_client is not None:
+        server_trace = await mcp_client.mcp_client.server_trace(trace_id)
+        if server_trace is not None:
+            recorded = Tracing.merge(recorded, server_trace)
+    return jsonify(recorded)
+
 @app.route('/call-agent', methods=['POST'])
 async def call_agent():
     try:
@@ -32,19 +108,34 @@ async def call_agent():
         if not msg:
             return jsonify({"error": "No message provided"}), 400
         else:
+            # Send the returned session_id with the next message to continue the conversation
+            session_id = data.get('session_id') or mcp_client.session_store.new_id()
 
-            client_agent = await mcp_client.main( ollama_host, model)
-            #client_agent = await direct_ollama_call.main(ollama_host, model)
+            with Tracing.trace("call-agent", session_id=session_id) as trace:
+                async with agent_queue.run():
+                    client_agent = await mcp_client.setup_agent(ollama_host, model)
+                    #client_agent = await direct_ollama_call.main(ollama_host, model)
 
-            response = await client_agent.run(msg) # This line is for client with ReActAgent
+                    response = await mcp_client.run(client_agent, msg, session_id) # This line is for client with ReActAgent
 
 
             print(f"Response from agent: {response}")
             # Return JSON response with 'response' key and 'hello' value
             return jsonify({
-            "response": str(response)
+            "response": str(response),
+            "session_id": session_id,
+            "trace_id": trace.id if trace else None
             })
 
+    except AgentQueueFull as e:
+        return busy_response(e)
+
+    except TimeoutError:
+        return jsonify({
+            "error": "Timeout",
+            "message": f"The agent didn't answer within {agent_queue.timeout} seconds"
+        }), 504
+
     except Exception as e:
         # Handle any errors and return error response
         return jsonify({
@@ -52,16 +143,68 @@ async def call_agent():
             "message": str(e)
         }), 400
 
-if __name__ == '__main__':
-
-
-    if len(sys.argv) < 2:
-        print("Usage: python main.py [ollama_host] [ollama_model]")
-        print("Example: python main.py http://10.10.1.1:11434 llama3.2")
-        sys.exit(1)
+@app.route('/call-agent-stream', methods=['POST'])
+async def call_agent_stream():
+    """Same as /call-agent but streams the agent's progress as Server-Sent Events"""
+    data = await request.get_json(silent=True) or {}
+    msg = data.get('msg', '')
+    if not msg:
+        return jsonify({"error": "No message provided"}), 400
+    session_id = data.get('session_id') or mcp_client.session_store.new_id()
+    try:
+        agent_queue.check()
+    except AgentQueueFull as e:
+        return busy_response(e)
+
+    async def generate():
+        try:
+            with Tracing.trace("call-agent-stream", session_id=session_id) as trace:
+                async with agent_queue.run():
+                    client_agent = await mcp_client.setup_agent(ollama_host, model)
+                    async for event in mcp_client.run_stream(client_agent, msg, session_id):
+                        if event["type"] == "final":
+                            event["session_id"] = session_id
+                            event["trace_id"] = trace.id if trace else None
+                        yield sse_event(event)
+        except TimeoutError:
+            yield sse_event({"type": "error", "message": f"The agent didn't answer within {agent_queue.timeout} seconds"})
+        except Exception as e:
+            yield sse_event({"type": "error", "message": str(e)})
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-    ollama_host = sys.argv[1]
-    model = sys.argv[2]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Web server of the MCP todo agent")
+    parser.add_argument("ollama_host", help="Ollama URL, e.g. http://10.10.1.1:11434")
+    parser.add_argument("model", help="Ollama model name, e.g. llama3.2")
+    parser.add_argument("--workers", type=int, help="Serve with hypercorn and this many worker processes")
+    args = parser.parse_args()
+
+    ollama_host = args.ollama_host
+    model = args.model
+
+    if args.workers:
+        # Production mode: hypercorn with worker processes, each one imports this module and reads the env
+        from hypercorn.config import Config
+        from hypercorn.run import run
+
+        # Every worker has its own AgentQueue, so split the limits across them to keep the totals
+        if args.workers < 1 or args.workers > agent_queue.concurrency:
+            parser.error(f"--workers must be between 1 and AGENT_CONCURRENCY ({agent_queue.concurrency}), "
+                         f"otherwise more agent runs than Ollama slots could happen at the same time")
+        # Sessions live in the memory of one worker, a follow-up served by another worker would lose its context
+        if args.workers > 1 and mcp_client.session_store.max_sessions > 0:
+            parser.error("sessions are kept per worker process, set AGENT_SESSIONS=0 to disable them "
+                         "before serving with more than one worker")
+        os.environ["AGENT_CONCURRENCY"] = str(agent_queue.concurrency // args.workers)
+        os.environ["AGENT_QUEUE_SIZE"] = str(agent_queue.max_waiting // args.workers)
+        os.environ["OLLAMA_URL"] = ollama_host
+        os.environ["OLLAMA_MODEL"] = model
+        config = Config()
+        config.application_path = "main:app"
+        config.bind = ["0.0.0.0:5000"]
+        config.workers = args.workers
+        sys.exit(run(config))
 
     app.run(debug=True, host='0.0.0.0', port=5000)
-
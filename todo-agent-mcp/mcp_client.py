@@ -1,61 +1,427 @@
 # pip install llama-index llama-index-llms-ollama llama-index-tools-mcp langchain-community
-from llama_index.tools.mcp import BasicMCPClient, McpToolSpec
+from llama_index.tools.mcp import McpToolSpec
 #from llama_index.core.agent.workflow import ReActAgent
 from llama_index.core.agent import ReActAgent # This one is lighter version (according to Claude)
+from llama_index.core.agent.workflow import AgentStream, ToolCall, ToolCallResult
+from llama_index.core.agent.react.types import ActionReasoningStep
+from llama_index.core.tools import ToolSelection
+from pydantic import Field
 from llama_index.llms.ollama import Ollama
-from prompt_templates import TODO_AGENT_PROMPT
+from llama_index.core.llms import ChatMessage
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+from prompt_templates import TODO_AGENT_PROMPT, context_block
+from ResponseCache import ResponseCache
+from ollama_client import get_async_client, keep_alive, warm_up
+from IntentRouter import IntentRouter
+from SessionStore import SessionStore
+import Tracing
+from datetime import timedelta
+import asyncio
+import httpx
+import json
 import os
+import re
+import uuid
+
+# "Action: <tool>" followed by "Action Input: {...}", the way the ReAct prompt asks for tool calls
+ACTION_PATTERN = re.compile(r"Action:\s*([A-Za-z0-9_]+)\s*\n+\s*Action Input:\s*(\{.*?\})\s*(?=\n\s*(?:Thought|Action|Observation)\b|$)",
+                            re.DOTALL)
 
 # Configuration variables
 MCP_URL = os.environ.get("MCP_URL", "http://127.0.0.1:3001/sse")
 TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0.7"))
+MCP_TIMEOUT = float(os.environ.get("MCP_TIMEOUT", "60"))
+# MCP resource with the todo list version, used to invalidate cached answers
+VERSION_URI = "todos://version"
+
+
+class PersistentMCPClient:
+    """
+    MCP client which keeps a single SSE session open and reuses it for every call.
+
+    The session lives in a background task (the SSE transport must be opened and
+    closed by the same task). When the connection drops, e.g. because the MCP
+    server restarted, the next call opens a new session and retries once.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = None
+        self.task = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        """Open the session if it isn't open yet"""
+        async with self.lock:
+            if self.session is not None and not self.task.done():
+                return
+            with Tracing.span("mcp.connect", url=self.url):
+                ready = asyncio.get_running_loop().create_future()
+                self.task = asyncio.create_task(self.run_session(ready))
+                self.session = await ready
+
+    async def run_session(self, ready):
+        try:
+            async with sse_client(self.url) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream,
+                                         read_timeout_seconds=timedelta(seconds=MCP_TIMEOUT)) as session:
+                    await session.initialize()
+                    print(f"Connected to MCP server at {self.url}")
+                    ready.set_result(session)
+                    # Keep the session open until it is closed or the connection drops
+                    await asyncio.Event().wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"MCP connection lost: {e!r}")
+        finally:
+            self.session = None
+
+    async def close(self):
+        """Close the session"""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.session = None
+
+    async def request(self, method: str, *args):
+        """Call a ClientSession method, reconnecting once if the connection is gone"""
+        attributes = {"tool": args[0]} if method == "call_tool" else {}
+        for attempt in range(2):
+            await self.connect()
+            try:
+                with Tracing.span(f"mcp.{method}", **attributes):
+                    # The server continues the request's trace for the tool's storage work
+                    meta = Tracing.propagation() if method == "call_tool" else None
+                    if meta:
+                        return await getattr(self.session, method)(*args, meta=meta)
+                    return await getattr(self.session, method)(*args)
+            except McpError:
+                # Error response from a live session, e.g. a timeout
+                raise
+            except Exception as e:
+                if attempt == 1:
+                    raise
+                print(f"MCP request failed ({e!r}), reconnecting...")
+                await self.close()
+
+    async def list_tools(self):
+        return await self.request("list_tools")
+
+    async def call_tool(self, tool_name: str, arguments: dict = None):
+        return await self.request("call_tool", tool_name, arguments)
+
+    async def list_resources(self):
+        return await self.request("list_resources")
+
+    async def read_resource(self, resource_uri):
+        return await self.request("read_resource", resource_uri)
+
+    async def server_trace(self, trace_id):
+        """Spans the server recorded for tool calls of a trace, None if it has none"""
+        url = self.url.removesuffix("/sse") + f"/traces/{trace_id}"
+        try:
+            async with httpx.AsyncClient(timeout=5) as client:
+                response = await client.get(url)
+        except httpx.HTTPError as e:
+            print(f"Error reading trace from the MCP server: {e}")
+            return None
+        return response.json() if response.status_code == 200 else None
+
+
+def parse_actions(text) -> list:
+    """(tool name, arguments) of every action in a ReAct step, empty if an action input isn't valid JSON"""
+    actions = []
+    for match in ACTION_PATTERN.finditer(text or ""):
+        try:
+            actions.append((match.group(1), json.loads(match.group(2))))
+        except json.JSONDecodeError:
+            return []
+    return actions
+
+
+class ParallelReActAgent(ReActAgent):
+    """
+    ReActAgent which runs several read-only tool calls of one step at the same time.
+
+    ReAct steps normally name a single action. When the LLM writes several
+    actions in one step and all of them are read-only tools (readOnlyHint
+    annotation of the MCP server), they are all returned as tool calls of the
+    step, which the agent workflow dispatches concurrently. Otherwise only the
+    first action runs, as before, so tools that change todos keep their order.
+    """
+
+    read_only_tools: set = Field(default_factory=set)
+
+    async def take_step(self, ctx, llm_input, tools, memory):
+        output = await super().take_step(ctx, llm_input, tools, memory)
+        if len(output.tool_calls) != 1:
+            return output
+        actions = parse_actions(output.response.content)
+        if len(actions) < 2 or any(name not in self.read_only_tools for name, _ in actions):
+            return output
+
+        output.tool_calls = [ToolSelection(tool_id=str(uuid.uuid4()), tool_name=name, tool_kwargs=arguments)
+                             for name, arguments in actions]
+        # The first action is already in the reasoning, add the others; the observations of all actions
+        # follow after them, in the same order (see handle_tool_call_results)
+        reasoning = await ctx.store.get(self.reasoning_key, default=[])
+        for name, arguments in actions[1:]:
+            reasoning.append(ActionReasoningStep(thought="", action=name, action_input=arguments))
+        await ctx.store.set(self.reasoning_key, reasoning)
+        await ctx.store.set("tool_call_order", [tool_call.tool_id for tool_call in output.tool_calls])
+        return output
+
+    async def handle_tool_call_results(self, ctx, results, memory):
+        if len(results) > 1:
+            # Results arrive in completion order, observations must follow the order of the actions
+            order = await ctx.store.get("tool_call_order", default=[])
+            results = sorted(results, key=lambda result: order.index(result.tool_id) if result.tool_id in order
+                             else len(order))
+        await super().handle_tool_call_results(ctx, results, memory)
+
+
+async def read_only_tool_names() -> set:
+    """Names of the MCP server's tools annotated as read-only"""
+    result = await mcp_client.list_tools()
+    return {tool.name for tool in result.tools if tool.annotations and tool.annotations.readOnlyHint}
+
+
+# Shared across requests, created once by setup_agent
+mcp_client = None
+agent = None
+agent_model = None
+system_prompt = None
+setup_lock = asyncio.Lock()
+response_cache = ResponseCache()
+intent_router = IntentRouter()
+session_store = SessionStore()
 
 
 async def setup_agent(llm_url: str, model: str) -> ReActAgent:
-    """Setup and return the todo assistant agent"""
+    """
+    Setup and return the todo assistant agent.
+
+    The MCP connection, tool list, LLM client and agent are created on the first
+    call and reused afterwards. Each agent.run() call gets its own context, so the
+    agent can serve concurrent requests.
+    """
+    global mcp_client, agent, agent_model, system_prompt
+
+    async with setup_lock:
+        if agent is not None:
+            return agent
+        try:
+            with Tracing.span("agent.setup", model=model):
+                if not llm_url.startswith("http"):
+                    raise ValueError("URL must start with http or https.")
+
+
+                # Connect to MCP server
+                print(f"Connecting to MCP server at {MCP_URL}")
+                if mcp_client is None:
+                    mcp_client = PersistentMCPClient(MCP_URL)
+
+                # Get tools list
+                print("Fetching available tools...")
+                tools = await McpToolSpec(client=mcp_client).to_tool_list_async()
+                print(f"Found {len(tools)} tools")
+
+                # Initialize Ollama LLM
+                print(f"Initializing Ollama with model {model}...")
+                llm = Ollama(
+                    base_url=llm_url,
+                    model=model,
+                    temperature=TEMPERATURE,
+                    async_client=get_async_client(llm_url), # Shared, keeps HTTP connections alive
+                    keep_alive=keep_alive(), # Keep the model loaded between requests
+                    context_window=8192, # Reduce from default (usually 4K-32K)
+                    #num_ctx=4096,  # Ollama-specific context limit
+                    #num_predict=1024 # Limit response length
+                )
+
+                # Create agent with flight search prompt
+                system_prompt = TODO_AGENT_PROMPT.template.replace("{tools}", "").replace("{tool_names}", "").replace(
+                    "{input}", "")
+                agent = ParallelReActAgent(
+                    name="TodoAgent",
+                    llm=llm,
+                    tools=tools,
+                    system_prompt=system_prompt,
+                    temperature=TEMPERATURE,
+                    max_iterations=5,
+                    read_only_tools=await read_only_tool_names()
+                )
+                agent_model = model
+
+                # Load the model now so the first request doesn't wait for it
+                await warm_up(llm_url, model)
+
+                return agent
+        except Exception as e:
+            print(f"Error setting up agent: {str(e)}")
+            raise
+
+
+async def state_version():
+    """Current todo list version from the MCP server, None if it can't be read"""
     try:
-        if not llm_url.startswith("http"):
-            raise ValueError("URL must start with http or https.")
-
-
-        # Connect to MCP server
-        print(f"Connecting to MCP server at {MCP_URL}")
-        mcp_client = BasicMCPClient(MCP_URL)
-
-        # Get tools list
-        print("Fetching available tools...")
-        tools = await McpToolSpec(client=mcp_client).to_tool_list_async()
-        print(f"Found {len(tools)} tools")
-
-        # Initialize Ollama LLM
-        print(f"Initializing Ollama with model {model}...")
-        llm = Ollama(
-            base_url=llm_url,
-            model=model,
-            temperature=TEMPERATURE,
-            context_window=8192, # Reduce from default (usually 4K-32K)
-            #num_ctx=4096,  # Ollama-specific context limit
-            #num_predict=1024 # Limit response length
-        )
-
-        # Create agent with flight search prompt
-        system_prompt = TODO_AGENT_PROMPT.template.replace("{tools}", "").replace("{tool_names}", "").replace(
-            "{input}", "")
-        agent = ReActAgent(
-            name="TodoAgent",
-            llm=llm,
-            tools=tools,
-            system_prompt=system_prompt,
-            temperature=TEMPERATURE,
-            max_iterations=5
-        )
+        result = await mcp_client.read_resource(VERSION_URI)
+        return result.contents[0].text
+    except Exception as e:
+        print(f"Error reading todo version: {e}")
+        return None
 
-        return agent
+
+async def cache_response(key, version, response: str):
+    """Cache an answer unless the todos changed since `version` was read"""
+    if key is None:
+        return
+    if await state_version() == version:
+        response_cache.put(key, response)
+    else:
+        response_cache.skip()
+
+
+def call_result_text(result) -> str:
+    """Text content of an MCP CallToolResult"""
+    return "\n".join(getattr(item, "text", "") for item in result.content)
+
+
+async def run_intent(msg: str):
+    """
+    Answer a plain command like "complete 12" with a direct MCP tool call.
+
+    Returns (intent, answer), or None when the message isn't a recognized command
+    or the tool call failed, in which case the agent should handle the message.
+    """
+    intent = intent_router.match(msg)
+    if intent is None:
+        return None
+    try:
+        result = await mcp_client.call_tool(intent.tool, intent.arguments)
     except Exception as e:
-        print(f"Error setting up agent: {str(e)}")
+        print(f"Direct tool call {intent.tool} failed, falling back to the agent: {e}")
+        return None
+    if result.isError:
+        return None
+    return intent, call_result_text(result)
+
+
+async def stop_when_cancelled(handler):
+    """Wait for an agent run, stopping the run when the waiting task is cancelled (timeout or client gone)"""
+    try:
+        return await handler
+    except asyncio.CancelledError:
+        if not handler.is_done():
+            await handler.cancel_run()
         raise
 
 
+def chat_history(session_id) -> list:
+    """Earlier turns of the session as llama_index chat messages"""
+    return [ChatMessage(role=message["role"], content=message["content"])
+            for message in session_store.messages(session_id)]
+
+
+async def run(agent: ReActAgent, msg: str, session_id: str = None) -> str:
+    """
+    Run the agent and return its answer.
+
+    Plain commands recognized by the intent router are executed with a direct
+    tool call instead of the ReAct loop.
+    Repeated questions are answered from the response cache as long as the todos
+    haven't changed. An answer is only cached when the todo version was the same
+    before and after the run, i.e. the run didn't change any todos.
+    With a session_id the earlier turns of the session (see SessionStore) are sent
+    as chat history, and answers to follow-ups in a session aren't cached.
+    """
+    routed = await run_intent(msg)
+    if routed is not None:
+        session_store.add_turn(session_id, msg, routed[1])
+        return routed[1]
+
+    history = chat_history(session_id)
+    version = await state_version()
+    key = None if history else response_cache.make_key(agent_model, system_prompt, msg, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        session_store.add_turn(session_id, msg, cached)
+        return cached
+
+    # The date goes after the message so the system prompt prefix stays the same
+    response = str(await stop_when_cancelled(agent.run(msg + context_block(), chat_history=history)))
+    await cache_response(key, version, response)
+    session_store.add_turn(session_id, msg, response)
+    return response
+
+
+def tool_result_text(tool_output) -> str:
+    """Text content of an MCP tool result"""
+    content = getattr(tool_output.raw_output, "content", None)
+    if isinstance(content, list):
+        return "\n".join(getattr(item, "text", "") for item in content)
+    return str(tool_output)
+
+
+async def run_stream(agent: ReActAgent, msg: str, session_id: str = None):
+    """
+    Run the agent and yield its progress as it happens.
+
+    Yields event dicts with a "type" of "token", "tool_call", "tool_result" or "final".
+    Cached answers (see run) are sent as a single "final" event.
+    """
+    routed = await run_intent(msg)
+    if routed is not None:
+        intent, answer = routed
+        session_store.add_turn(session_id, msg, answer)
+        yield {"type": "tool_call", "name": intent.tool, "arguments": intent.arguments}
+        yield {"type": "tool_result", "name": intent.tool, "output": answer}
+        yield {"type": "final", "text": answer}
+        return
+
+    history = chat_history(session_id)
+    version = await state_version()
+    key = None if history else response_cache.make_key(agent_model, system_prompt, msg, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        session_store.add_turn(session_id, msg, cached)
+        yield {"type": "final", "text": cached, "cached": True}
+        return
+
+    handler = agent.run(msg + context_block(), chat_history=history)
+    try:
+        async for event in handler.stream_events():
+            if isinstance(event, AgentStream):
+                if event.delta:
+                    yield {"type": "token", "text": event.delta}
+            elif isinstance(event, ToolCallResult):
+                yield {"type": "tool_result", "name": event.tool_name, "output": tool_result_text(event.tool_output)}
+            elif isinstance(event, ToolCall):
+                yield {"type": "tool_call", "name": event.tool_name, "arguments": event.tool_kwargs}
+
+        response = str(await handler)
+    finally:
+        # Stop the run when the stream was closed early, e.g. on timeout or when the client disconnected
+        if not handler.is_done():
+            await handler.cancel_run()
+    await cache_response(key, version, response)
+    session_store.add_turn(session_id, msg, response)
+    yield {"type": "final", "text": response}
+
+
+async def shutdown():
+    """Close the shared MCP connection"""
+    if mcp_client is not None:
+        await mcp_client.close()
+
+
 async def main(llm_url: str, model: str) -> ReActAgent:
     """Main function to run the todo agent application"""
 
@@ -91,4 +457,4 @@ async def main(llm_url: str, model: str) -> ReActAgent:
 
 
 # if __name__ == "__main__":
-#     sys.exit(asyncio.run(main()))
\ No newline at end of file
+#     sys.exit(asyncio.run(main()))
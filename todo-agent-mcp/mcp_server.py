@@ -6,13 +6,26 @@ that follow Anthropic's Model Context Protocol specification. These tools can be
 accessed by Claude and other MCP-compatible AI models.
 """
 from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
+from starlette.responses import JSONResponse, PlainTextResponse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import argparse
+import asyncio
+import contextvars
+import os
 from TodoManager import *
 from EmailManager import *
+from ReminderScheduler import ReminderScheduler
+import Tracing
 
 # Default server settings
 DEFAULT_PORT = 3001
 DEFAULT_CONNECTION_TYPE = "http"  # Alternative: "stdio"
+# Threads available for blocking storage work of tool calls
+TOOL_WORKERS = int(os.environ.get("MCP_TOOL_WORKERS", "8"))
+# Tools which don't change anything, clients may call several of them at the same time
+READ_ONLY = ToolAnnotations(readOnlyHint=True)
 
 import logging
 from rich.logging import RichHandler
@@ -40,37 +53,85 @@ def setup_logging():
 logger = setup_logging()
 
 
-def create_mcp_server(port=DEFAULT_PORT):
+class TracedFastMCP(FastMCP):
+    """
+    FastMCP server recording a "tool.<name>" span for every tool call.
+
+    The span continues the client's trace when the call's metadata carries its
+    trace_id and span_id (see Tracing.propagation), so the storage spans of a
+    request can be looked up on /traces/<trace_id> and merged by the client.
+    """
+
+    async def call_tool(self, name, arguments):
+        request_context = self.get_context().request_context
+        meta = request_context.meta if request_context else None
+        with Tracing.trace(f"tool.{name}", trace_id=getattr(meta, "trace_id", None),
+                           parent_id=getattr(meta, "span_id", None)):
+            return await super().call_tool(name, arguments)
+
+
+def create_mcp_server(port=DEFAULT_PORT, todo_manager=None, email_manager=None):
     """
     Create and configure the Model Context Protocol server.
 
     Args:
         port: Port number to run the server on
+        todo_manager: Shared TodoManager instance (optional)
+        email_manager: Shared EmailManager instance (optional)
 
     Returns:
         Configured MCP server instance
     """
-    mcp = FastMCP("todo-mcp-server", port=port)
+    mcp = TracedFastMCP("todo-mcp-server", port=port)
 
     # Register MCP-compliant tools
-    register_tools(mcp)
+    register_tools(mcp, todo_manager, email_manager)
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def metrics(request):
+        """Tool call, CSV and SMTP timings in the Prometheus text format"""
+        return PlainTextResponse(Tracing.render_metrics("todo_mcp"), media_type="text/plain; version=0.0.4")
+
+    @mcp.custom_route("/traces/{trace_id}", methods=["GET"])
+    async def trace_detail(request):
+        """Spans the tool calls of a client's request recorded here"""
+        recorded = Tracing.get_trace(request.path_params["trace_id"])
+        if recorded is None:
+            return JSONResponse({"error": "Unknown trace"}, status_code=404)
+        return JSONResponse(recorded)
 
     return mcp
 
 
-def register_tools(mcp):
+def register_tools(mcp, todo_manager=None, email_manager=None):
     """
     Register all tools with the MCP server following the Model Context Protocol specification.
 
     Each tool is decorated with @mcp.tool() to make it available via the MCP interface.
+    The managers are created once here and shared by every tool call.
+    Tools are async: blocking storage work runs on a bounded thread pool, so a slow
+    call doesn't hold up the event loop serving the other MCP sessions.
 
     Args:
         mcp: The MCP server instance
+        todo_manager: Shared TodoManager instance (optional)
+        email_manager: Shared EmailManager instance (optional)
     """
+    if todo_manager is None:
+        todo_manager = TodoManager()
+    if email_manager is None:
+        email_manager = EmailManager()
+
+    executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="todo-tool")
+
+    async def run_blocking(fn, *args):
+        """Run a blocking function on the tool thread pool, in the context of the tool call so its spans join the trace"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(context.run, fn, *args))
 
     # Create tool functions that wrap your TodoManager methods
     @mcp.tool()
-    def add_todo_task(task: str, description: str, due_date: str, due_time: str) -> str:
+    async def add_todo_task(task: str, description: str, due_date: str, due_time: str) -> str:
         """
         Add a new todo item with task name, description, due date and time
 
@@ -83,11 +144,9 @@ def register_tools(mcp):
         Returns:
             Success message with new todo ID or failure message
         """
-        todo_manager = TodoManager()
-        email_manager = EmailManager()
-
-        new_id = todo_manager.add_todo(task, description, due_date, due_time)
+        new_id = await run_blocking(todo_manager.add_todo, task, description, due_date, due_time)
         if new_id != -1:
+            # Only queues the email, it is sent by the EmailManager worker
             email_manager.send_email("New Todo Added",
                                       f"A new todo has been added:\n\nTask: {task}\nDescription: {description}\nDue Date: {due_date}\nDue Time: {due_time}")
 
@@ -95,21 +154,71 @@ def register_tools(mcp):
         return "Failed to add todo"
 
     @mcp.tool()
-    def list_all_todos(status: str = None) -> str:
+    async def add_todo_tasks(todos: list[dict]) -> str:
+        """
+        Add several todo items at once. Use this instead of calling add_todo_task repeatedly.
+
+        Args:
+            todos: List of todos, each a dict with "task", "description", "due_date" (YYYY-MM-DD) and "due_time" (HH:MM)
+
+        Returns:
+            Success message with the new todo IDs or failure message
+        """
+        new_ids = await run_blocking(todo_manager.add_todos, todos)
+        if not new_ids:
+            return "Failed to add todos"
+
+        # One summary email for the whole batch, only queued here
+        body = f"{len(new_ids)} new todos have been added:\n\n"
+        for todo in todos:
+            body += f"Task: {todo['task']}\nDescription: {todo.get('description', '')}\nDue Date: {todo['due_date']}\nDue Time: {todo['due_time']}\n\n"
+        email_manager.send_email("New Todos Added", body)
+
+        return f"{len(new_ids)} todos added successfully with IDs {', '.join(str(new_id) for new_id in new_ids)}"
+
+    @mcp.tool(annotations=READ_ONLY)
+    async def list_all_todos(status: str = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+                             due_from: str = None, due_to: str = None, text: str = None,
+                             columns: str = None, compact: bool = True) -> str:
         """
-        List all todos, optionally filtered by status (pending, completed). If no status is provided, all todos with any status are listed.
+        List todos, optionally filtered by status (pending, completed), due date range or text. If no status is provided, all todos with any status are listed.
+        Results are paginated: when there are more todos the response tells which offset to use for the next page.
 
         Args:
             status: Filter todos by status (optional). If "None", lists all todos
+            limit: Maximum number of todos to return (default 20, at most 100)
+            offset: Number of matching todos to skip, for the next page
+            due_from: Only todos due on or after this date, in YYYY-MM-DD format (optional)
+            due_to: Only todos due on or before this date, in YYYY-MM-DD format (optional)
+            text: Only todos whose task or description contains this text (optional)
+            columns: Comma-separated columns to return, e.g. "id,task,due_date" (optional, default all)
+            compact: If True, return one "|"-separated line per todo instead of an aligned table
 
         Returns:
             String representation of the todo list
         """
-        todo_manager = TodoManager()
-        return todo_manager.list_todos(status)
+        limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        return await run_blocking(partial(todo_manager.list_todos, status, limit, offset, due_from, due_to, text,
+                                          columns, compact))
+
+    @mcp.tool(annotations=READ_ONLY)
+    async def search_todos(query: str, limit: int = 5, status: str = None) -> str:
+        """
+        Find todos by words from their task or description, e.g. to get the ID of the todo the user means.
+        Tolerates typos and partial words. Use this instead of listing all todos when the user didn't give a todo ID.
+
+        Args:
+            query: Words describing the todo, e.g. "groceries"
+            limit: Maximum number of matches to return (default 5)
+            status: Only return todos with this status (pending, completed) (optional)
+
+        Returns:
+            One line per matching todo, best match first, with a match score between 0 and 1
+        """
+        return await run_blocking(todo_manager.search_todos, query, limit, status)
 
     @mcp.tool()
-    def complete_todo_task(todo_id: int) -> str:
+    async def complete_todo_task(todo_id: int) -> str:
         """
         Mark a todo as completed by its ID
 
@@ -119,11 +228,10 @@ def register_tools(mcp):
         Returns:
             Success message with todo ID or failure message
         """
-        todo_manager = TodoManager()
-        return todo_manager.complete_todo(todo_id)
+        return await run_blocking(todo_manager.complete_todo, todo_id)
 
     @mcp.tool()
-    def delete_todo_task(todo_id: int) -> str:
+    async def delete_todo_task(todo_id: int) -> str:
         """
         Delete a todo by its ID
         Args:
@@ -131,38 +239,65 @@ def register_tools(mcp):
         Returns:
             Success message with todo ID or failure message
         """
-        todo_manager = TodoManager()
-        return todo_manager.delete_todo(todo_id)
+        return await run_blocking(todo_manager.delete_todo, todo_id)
+
+    @mcp.tool()
+    async def complete_todo_tasks(todo_ids: list[int] = None, due_from: str = None, due_to: str = None,
+                                  text: str = None) -> str:
+        """
+        Mark several todos as completed at once, either by their IDs or all pending todos matching the filters,
+        e.g. due_from and due_to set to yesterday's date to complete everything due yesterday.
+
+        Args:
+            todo_ids: IDs of the todos to mark as completed (optional)
+            due_from: Complete pending todos due on or after this date, in YYYY-MM-DD format (optional)
+            due_to: Complete pending todos due on or before this date, in YYYY-MM-DD format (optional)
+            text: Complete pending todos whose task or description contains this text (optional)
+
+        Returns:
+            Which todos were marked as completed and which weren't found
+        """
+        return await run_blocking(todo_manager.complete_todos, todo_ids, due_from, due_to, text)
 
     @mcp.tool()
-    def check_upcoming_todos_task(response: bool) -> str:
+    async def delete_todo_tasks(todo_ids: list[int] = None, due_from: str = None, due_to: str = None,
+                                text: str = None) -> str:
         """
-        Check for todos due within the next 24 hours and send email reminders.
+        Delete several todos at once, either by their IDs or all todos matching the filters.
+
+        Args:
+            todo_ids: IDs of the todos to delete (optional)
+            due_from: Delete todos due on or after this date, in YYYY-MM-DD format (optional)
+            due_to: Delete todos due on or before this date, in YYYY-MM-DD format (optional)
+            text: Delete todos whose task or description contains this text (optional)
+
+        Returns:
+            Which todos were deleted and which weren't found
+        """
+        return await run_blocking(todo_manager.delete_todos, todo_ids, due_from, due_to, text)
+
+    @mcp.tool(annotations=READ_ONLY)
+    async def check_upcoming_todos_task(response: bool) -> str:
+        """
+        Check for todos due within the next 24 hours. Email reminders are sent automatically by the server.
         If response argument passed with True to this function there will be a response text returned. Otherwise, no text will be returned.
 
         Args:
-            response: If True return a text, if False return an empty text, just send email reminders
+            response: If True return a text, if False return an empty text
 
         Returns:
             Status message about upcoming todos or empty string
         """
-        todo_manager = TodoManager()
-        email_reminder = EmailManager()
+        if not response:
+            # Reminders are sent by the background ReminderScheduler, nothing to do here
+            return ""
 
-        upcoming_todos = todo_manager.get_upcoming_todos()
+        upcoming_todos = await run_blocking(todo_manager.get_upcoming_todos)
         if upcoming_todos:
-            email_reminder.send_reminder(upcoming_todos)
-            if response:
-                return f"You have {len(upcoming_todos)} todos upcoming within 24hours. Reminders sent via email."
-            else:
-                return ""
-        else:
-            if response:
-                return "No todos due within the next 24 hours."
-            else:
-                return ""
+            return f"You have {len(upcoming_todos)} todos upcoming within 24hours. Reminders are sent via email."
+        return "No todos due within the next 24 hours."
 
-    @mcp.tool()
+    @mcp.tool(annotations=READ_ONLY)
     def get_current_date() -> str:
         """
         Get the current date in YYYY-MM-DD HH:MM format
@@ -171,7 +306,7 @@ def register_tools(mcp):
         """
         return datetime.now().strftime("%Y-%m-%d %HH:%M")
 
-    @mcp.tool()
+    @mcp.tool(annotations=READ_ONLY)
     def server_status():
         """
         Check if the Model Context Protocol server is running.
@@ -183,6 +318,15 @@ def register_tools(mcp):
         """
         return {"status": "online", "message": "MCP ToDo Agent server is running"}
 
+    @mcp.resource("todos://version")
+    def todo_version() -> str:
+        """
+        Version of the todo list, it changes whenever a todo is added, completed or deleted,
+        also by another process sharing the storage.
+        Clients use it to tell whether cached answers are still valid.
+        """
+        return str(todo_manager.version)
+
     logger.debug("Model Context Protocol tools registered")
 
 
@@ -196,10 +340,20 @@ def main():
                         choices=["http", "stdio"], help="Connection type (http or stdio)")
     parser.add_argument("--port", type=int, default=DEFAULT_PORT,
                         help=f"Port to run the server on (default: {DEFAULT_PORT})")
+    parser.add_argument("--no_reminders", action="store_true",
+                        help="Don't send reminder emails for upcoming todos in the background")
     args = parser.parse_args()
 
+    # Shared managers for all tool calls
+    todo_manager = TodoManager()
+    email_manager = EmailManager()
+
+    # Send reminders in the background instead of during tool calls
+    if not args.no_reminders:
+        ReminderScheduler(todo_manager, email_manager).start()
+
     # Initialize MCP server
-    mcp = create_mcp_server(port=args.port)
+    mcp = create_mcp_server(port=args.port, todo_manager=todo_manager, email_manager=email_manager)
 
     # Determine server type
     server_type = "sse" if args.connection_type == "http" else "stdio"
@@ -207,7 +361,12 @@ def main():
     # Start the server
     logger.info(
         f"🚀 Starting Model Context Protocol ToDo Agent Service on port {args.port} with {args.connection_type} connection")
-    mcp.run(server_type)
+    try:
+        mcp.run(server_type)
+    finally:
+        # Deliver emails that are still queued and write pending todo changes
+        email_manager.stop()
+        todo_manager.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""
+Shared Ollama clients.
+
+One AsyncClient per Ollama host is created and reused by every request, so HTTP
+connections are kept alive and pooled instead of being opened per call.
+Requests pass `keep_alive` so the model stays loaded between requests, and
+warm_up() loads the model at startup so the first user doesn't wait for it.
+Every chat/generate call is traced as an "llm.chat"/"llm.generate" span with
+the prompt evaluation and generation speed Ollama reports.
+"""
+import os
+import ollama
+import Tracing
+
+# How long Ollama keeps the model in memory after a request, e.g. "30m", "-1" = forever
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "120"))
+
+async_clients = {}
+
+
+def keep_alive():
+    """OLLAMA_KEEP_ALIVE as Ollama expects it, a number of seconds or a duration string"""
+    try:
+        return float(KEEP_ALIVE)
+    except ValueError:
+        return KEEP_ALIVE
+
+
+def record_usage(attributes: dict, response):
+    """Add the token counts and speeds of Ollama's final response to span attributes"""
+    prompt_tokens = getattr(response, "prompt_eval_count", None) or 0
+    prompt_ns = getattr(response, "prompt_eval_duration", None) or 0
+    generated_tokens = getattr(response, "eval_count", None) or 0
+    generation_ns = getattr(response, "eval_duration", None) or 0
+    attributes["prompt_tokens"] = prompt_tokens
+    attributes["generated_tokens"] = generated_tokens
+    attributes["prompt_eval_ms"] = round(prompt_ns / 1e6, 3)
+    attributes["generation_ms"] = round(generation_ns / 1e6, 3)
+    if prompt_ns:
+        attributes["prompt_tokens_per_s"] = round(prompt_tokens / (prompt_ns / 1e9), 1)
+    if generation_ns:
+        attributes["gen_tokens_per_s"] = round(generated_tokens / (generation_ns / 1e9), 1)
+    Tracing.count("llm_prompt_tokens", prompt_tokens)
+    Tracing.count("llm_generated_tokens", generated_tokens)
+    Tracing.observe("llm.prompt_eval", prompt_ns / 1e9)
+    Tracing.observe("llm.generation", generation_ns / 1e9)
+
+
+class TracedAsyncClient(ollama.AsyncClient):
+    """AsyncClient recording a span per chat/generate call"""
+
+    async def chat(self, *args, **kwargs):
+        return await self._traced("llm.chat", super().chat, args, kwargs)
+
+    async def generate(self, *args, **kwargs):
+        return await self._traced("llm.generate", super().generate, args, kwargs)
+
+    async def _traced(self, name, call, args, kwargs):
+        model = kwargs.get("model") or (args[0] if args else "")
+        if kwargs.get("stream"):
+            return self._traced_stream(name, model, call, args, kwargs)
+        with Tracing.span(name, model=model, stream=False) as attributes:
+            response = await call(*args, **kwargs)
+            record_usage(attributes, response)
+            return response
+
+    async def _traced_stream(self, name, model, call, args, kwargs):
+        # The span covers the whole stream, the token counts are in its last chunk
+        with Tracing.span(name, model=model, stream=True) as attributes:
+            last = None
+            async for chunk in await call(*args, **kwargs):
+                last = chunk
+                yield chunk
+            if last is not None:
+                record_usage(attributes, last)
+
+
+def get_async_client(host: str) -> ollama.AsyncClient:
+    """Return the shared AsyncClient for the host, creating it on first use"""
+    client = async_clients.get(host)
+    if client is None:
+        client = TracedAsyncClient(host=host, timeout=REQUEST_TIMEOUT)
+        async_clients[host] = client
+    return client
+
+
+async def warm_up(host: str, model: str) -> bool:
+    """Load the model into memory with an empty request, returns False if that failed"""
+    try:
+        print(f"Loading model {model} on {host} (keep_alive={KEEP_ALIVE})...")
+        await get_async_client(host).generate(model=model, prompt="", keep_alive=keep_alive())
+        return True
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+        return False
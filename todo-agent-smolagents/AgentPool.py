@@ -0,0 +1,129 @@
+import math
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AgentPoolTimeout(Exception):
+    """Raised when no agent became available within the pool timeout"""
+
+
+class AgentPoolFull(Exception):
+    """Raised when all agents are busy and the wait queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many requests, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class AgentRunTimeout(Exception):
+    """Raised when an agent run was interrupted because it took longer than the run timeout"""
+
+
+class AgentPool:
+    """
+    Bounded pool of pre-built agents.
+
+    Building an agent (model client, tools) is done once per pool slot at startup
+    instead of on every request. A request checks an agent out, runs it and hands
+    it back with its memory reset. The pool size caps how many agent runs can
+    happen at the same time; callers wait up to `timeout` seconds for a free agent.
+    At most `max_waiting` callers wait, further ones get AgentPoolFull right away
+    with a Retry-After estimate, and a run taking longer than `run_timeout`
+    seconds is interrupted (AgentRunTimeout).
+    Values come from AGENT_POOL_SIZE, AGENT_POOL_TIMEOUT, AGENT_QUEUE_SIZE and AGENT_TIMEOUT.
+    """
+
+    def __init__(self, factory, size=None, timeout=None, max_waiting=None, run_timeout=None):
+        self.size = size or int(os.getenv("AGENT_POOL_SIZE", "2"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("AGENT_POOL_TIMEOUT", "30"))
+        self.max_waiting = max_waiting if max_waiting is not None else int(os.getenv("AGENT_QUEUE_SIZE", "8"))
+        self.run_timeout = run_timeout if run_timeout is not None else float(os.getenv("AGENT_TIMEOUT", "120"))
+        self.agents = queue.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            self.agents.put(factory())
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.avg_run_time = None
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a new request would get an agent"""
+        run_time = self.avg_run_time or 5.0
+        return max(1, math.ceil(run_time * (self.waiting + 1) / self.size))
+
+    def _check(self):
+        """Raise AgentPoolFull when a new request would be rejected, must be called with the lock held"""
+        if self.agents.empty() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise AgentPoolFull(self.retry_after())
+
+    def check(self):
+        """Raise AgentPoolFull when a new request would be rejected"""
+        with self.lock:
+            self._check()
+
+    def acquire(self):
+        """Check out an agent, waiting up to the pool timeout"""
+        with self.lock:
+            self._check()
+            self.waiting += 1
+        try:
+            return self.agents.get(timeout=self.timeout)
+        except queue.Empty:
+            raise AgentPoolTimeout(f"No agent available after {self.timeout} seconds")
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self, agent):
+        """Reset the agent's memory and return it to the pool"""
+        try:
+            agent.reset()
+        finally:
+            self.agents.put(agent)
+
+    @contextmanager
+    def agent(self):
+        """Context manager checking an agent out for the duration of a request"""
+        agent = self.acquire()
+        # The agent stops before its next step once interrupted
+        timer = threading.Timer(self.run_timeout, agent.interrupt)
+        timer.daemon = True
+        start = time.monotonic()
+        timer.start()
+        try:
+            yield agent
+        except Exception as e:
+            if timer.finished.is_set():
+                with self.lock:
+                    self.timed_out += 1
+                raise AgentRunTimeout(f"The agent didn't answer within {self.run_timeout} seconds") from e
+            raise
+        finally:
+            timer.cancel()
+            run_time = time.monotonic() - start
+            with self.lock:
+                # Moving average, so the estimate follows the current load
+                self.avg_run_time = run_time if self.avg_run_time is None else 0.8 * self.avg_run_time + 0.2 * run_time
+                self.completed += 1
+            self.release(agent)
+
+    def stats(self) -> dict:
+        """Counters of the pool"""
+        with self.lock:
+            return {
+                "size": self.size,
+                "available": self.agents.qsize(),
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "timeout": self.run_timeout,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_run_time": round(self.avg_run_time, 3) if self.avg_run_time is not None else None,
+            }
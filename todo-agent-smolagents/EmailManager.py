@@ -1,12 +1,35 @@
 import os
+import queue
 import smtplib
 import ssl
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+import Tracing
+
+
+class OutgoingEmail:
+    """A queued email and, for callers that wait, the outcome of sending it"""
+    def __init__(self, msg):
+        self.msg = msg
+        self.sent = False
+        self.done = threading.Event()
+
 
 class EmailManager:
-    def __init__(self):
+    """
+    Sends emails through an outbound queue.
+
+    send_email only puts the message on the queue. A background worker keeps one
+    authenticated SMTP connection open, sends queued messages in batches over it,
+    reconnects when the connection is lost and retries temporary failures with
+    exponential backoff; a message the server rejects permanently doesn't hold
+    up the ones behind it. The connection is closed after EMAIL_IDLE_TIMEOUT seconds
+    without mail.
+    """
+    def __init__(self, batch_size=20, max_retries=5, retry_backoff=1.0):
         load_dotenv()
 
         self.host = os.getenv('EMAIL_HOST')
@@ -15,12 +38,158 @@ class EmailManager:
         self.password = os.getenv('EMAIL_PASSWORD')
         self.from_email = os.getenv('EMAIL_FROM')
         self.to_email = os.getenv('EMAIL_TO')
-
-    def send_email(self, subject, body):
-        """Send a simple email with the given subject and body"""
+        self.use_ssl = os.getenv('EMAIL_USE_SSL', 'true').lower() != 'false'
+        self.idle_timeout = float(os.getenv('EMAIL_IDLE_TIMEOUT', '60'))
+
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue()
+        self.server = None
+        self.worker = None
+        self.worker_lock = threading.Lock()
+
+    def connect(self):
+        """Open and authenticate the SMTP connection"""
+        with Tracing.span("smtp.connect", host=self.host):
+            if self.use_ssl:
+                context = ssl.create_default_context()
+                self.server = smtplib.SMTP_SSL(self.host, self.port, timeout=30, context=context)
+            else:
+                self.server = smtplib.SMTP(self.host, self.port, timeout=30)
+            print(f"Connected to the server")
+            if self.user:
+                # Local test servers usually don't offer AUTH, send without login there
+                self.server.ehlo_or_helo_if_needed()
+                if self.server.has_extn("auth"):
+                    print(f"Logging in")
+                    self.server.login(self.user, self.password)
+                else:
+                    print(f"Server doesn't offer AUTH, sending without login")
+
+    def disconnect(self):
+        """Close the SMTP connection if it is open"""
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            pass
+        self.server = None
+
+    def start(self):
+        """Start the queue worker if it isn't running yet"""
+        with self.worker_lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name="email-worker", daemon=True)
+                self.worker.start()
+
+    def stop(self):
+        """Send everything that is queued, then stop the worker and close the connection"""
+        with self.worker_lock:
+            if self.worker is None:
+                return
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+
+    def flush(self):
+        """Block until every queued email has been processed"""
+        self.queue.join()
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self.disconnect()
+                continue
+
+            if item is None:
+                self.queue.task_done()
+                self.disconnect()
+                return
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    next_item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    stop = True
+                    break
+                batch.append(next_item)
+
+            self.send_batch(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+            if stop:
+                self.queue.task_done()
+                self.disconnect()
+                return
+
+    @staticmethod
+    def is_permanent(error) -> bool:
+        """Whether sending a message failed for a reason that retrying won't fix (5xx reply, bad message)"""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 500 <= error.smtp_code < 600
+        # Lost connection, network errors (smtplib's errors are OSErrors too)
+        if isinstance(error, OSError):
+            return False
+        # E.g. a message that can't be encoded
+        return True
+
+    def send_batch(self, batch):
+        """
+        Send a batch over the shared connection.
+
+        A message the server rejects permanently is failed on its own and the
+        batch goes on. On a lost connection or a temporary (4xx) error the worker
+        reconnects with exponential backoff and resumes from the failed message.
+        """
+        remaining = list(batch)
+        attempt = 0
+        while remaining:
+            try:
+                if self.server is None:
+                    self.connect()
+                print(f"Sending {len(remaining)} email(s)")
+                while remaining:
+                    item = remaining[0]
+                    try:
+                        with Tracing.span("smtp.send"):
+                            self.server.send_message(item.msg)
+                        item.sent = True
+                    except Exception as e:
+                        if not self.is_permanent(e):
+                            raise
+                        print(f"Email to {item.msg['To']} rejected: {e}")
+                    remaining.pop(0)
+                    item.done.set()
+                    attempt = 0
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                self.disconnect()
+                if attempt >= self.max_retries:
+                    break
+                time.sleep(self.retry_backoff * 2 ** attempt)
+                attempt += 1
+
+        for item in remaining:
+            item.done.set()
+
+    def send_email(self, subject, body, wait=False):
+        """
+        Queue a simple email with the given subject and body.
+
+        Returns True once the email is queued, or with wait=True, whether it was actually sent.
+        """
         try:
-
-
             msg = MIMEMultipart()
             msg['From'] = self.from_email
             msg['To'] = self.to_email
@@ -28,23 +197,23 @@ class EmailManager:
 
             msg.attach(MIMEText(body, 'plain'))
 
-            context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(self.host, self.port,timeout=30, context=context) as server:
-                print(f"Connected to the server, logging in")
-                server.login(self.user, self.password)
-                print(f"Sending the email")
-                server.send_message(msg)
+            item = OutgoingEmail(msg)
+            self.start()
+            self.queue.put(item)
 
+            if wait:
+                item.done.wait()
+                return item.sent
             return True
 
         except Exception as e:
             print(f"Error sending email: {e}")
             return False
 
-    def send_reminder(self, todos):
-        """Send email reminder for upcoming todos"""
+    def send_reminder(self, todos, wait=False):
+        """Send email reminder for upcoming todos, returns True if the email was queued (or sent with wait=True)"""
         if not todos:
-            return
+            return False
 
         try:
 
@@ -59,10 +228,12 @@ class EmailManager:
 
             body += "Don't forget to complete them on time!\n\nBest regards,\nYour AI Todo Assistant"
 
-            if self.send_email(subject,body):
-                print(f"Reminder email sent successfully for {len(todos)} todos")
+            if self.send_email(subject, body, wait=wait):
+                print(f"Reminder email {'sent' if wait else 'queued'} successfully for {len(todos)} todos")
+                return True
             else:
                 print("Failed to send reminder email")
 
         except Exception as e:
             print(f"Error sending email: {e}")
+        return False
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+# Defaults, can be changed with LLM_CACHE_SIZE, LLM_CACHE_TTL and LLM_CACHE_FILE
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 300
+
+
+def normalize_message(message) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variations share an entry"""
+    text = re.sub(r"\s+", " ", str(message).strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class ResponseCache:
+    """
+    Cache of final agent/LLM answers.
+
+    Entries are keyed on the model, a hash of the system prompt, the normalized
+    user message, the todo state version and the current day, so any change to
+    the todos and any new day start from a fresh entry. Recently used entries
+    are kept in memory (LRU, at most `max_entries`), every entry expires after
+    `ttl` seconds. With a `disk_file` entries are also written to a small SQLite
+    database, so they survive restarts and are shared between worker processes.
+    Set LLM_CACHE_SIZE=0 to disable the cache.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, disk_file=None):
+        self.max_entries = int(os.getenv("LLM_CACHE_SIZE", DEFAULT_CACHE_SIZE)) if max_entries is None else max_entries
+        self.ttl = float(os.getenv("LLM_CACHE_TTL", DEFAULT_CACHE_TTL)) if ttl is None else ttl
+        self.disk_file = disk_file or os.getenv("LLM_CACHE_FILE")
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.conn = None
+        if self.enabled and self.disk_file:
+            self.conn = sqlite3.connect(self.disk_file, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+                )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def make_key(self, model, system_prompt, message, version) -> str:
+        """Cache key of a request, None when the todo state version is unknown"""
+        if version is None:
+            return None
+        prompt_hash = hashlib.sha256(str(system_prompt).encode("utf-8")).hexdigest()
+        parts = [str(model), prompt_hash, normalize_message(message), str(version), date.today().isoformat()]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached answer for the key, or None"""
+        if not self.enabled or key is None:
+            return None
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.entries.pop(key, None)
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store an answer"""
+        if not self.enabled or key is None:
+            return
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, value, expires_at)
+            self.stores += 1
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                                      (key, value, expires_at))
+                    if self.stores % 100 == 0:
+                        self.conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def skip(self):
+        """Count an answer that wasn't cached because the todos changed while it was produced"""
+        with self.lock:
+            self.skipped += 1
+
+    def _remember(self, key, value, expires_at):
+        """Add an entry to the memory tier, must be called with the lock held"""
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries"""
+        with self.lock:
+            self.entries.clear()
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "entries": len(self.entries),
+            }
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Defaults, can be changed with AGENT_SESSIONS, AGENT_SESSION_TTL and AGENT_SESSION_TOKENS
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_SESSION_TTL = 1800
+DEFAULT_SESSION_TOKENS = 2000
+# Characters kept per message when a turn is folded into the summary
+SUMMARY_USER_CHARS = 200
+SUMMARY_ANSWER_CHARS = 400
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count of a text, about 4 characters per token"""
+    return len(str(text)) // 4 + 1
+
+
+def shorten(text, max_chars) -> str:
+    """Text on one line, cut to max_chars"""
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+
+def summarize_turns(summary: str, turns: list) -> str:
+    """Append one short line per (user, answer) turn to the summary"""
+    lines = [summary] if summary else []
+    for user, answer in turns:
+        lines.append(f"- User: {shorten(user, SUMMARY_USER_CHARS)} -> Assistant: {shorten(answer, SUMMARY_ANSWER_CHARS)}")
+    return "\n".join(lines)
+
+
+class Session:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.summary = ""
+        self.turns = []
+        self.tokens = 0
+        self.last_used = time.time()
+
+
+class SessionStore:
+    """
+    Conversation memory of agent sessions, keyed on a session ID.
+
+    Each session keeps its recent (user message, answer) turns verbatim, at most
+    `max_tokens` (estimated) of them. When a new turn goes over the budget the
+    oldest turns are folded into a running summary by `summarize`, so follow-up
+    messages like "mark the second one done" still have the context without the
+    whole conversation being sent again. The summary is capped to a quarter of
+    the budget, dropping its oldest lines first.
+    At most `max_sessions` sessions are kept (least recently used are dropped)
+    and a session expires `ttl` seconds after its last use.
+    """
+
+    def __init__(self, max_sessions=None, ttl=None, max_tokens=None, summarize=None):
+        self.max_sessions = int(os.getenv("AGENT_SESSIONS", DEFAULT_MAX_SESSIONS)) if max_sessions is None else max_sessions
+        self.ttl = float(os.getenv("AGENT_SESSION_TTL", DEFAULT_SESSION_TTL)) if ttl is None else ttl
+        self.max_tokens = int(os.getenv("AGENT_SESSION_TOKENS", DEFAULT_SESSION_TOKENS)) if max_tokens is None else max_tokens
+        self.summarize = summarize or summarize_turns
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+        self.summarized = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def _get(self, session_id):
+        """Live session for the ID or None, must be called with the lock held"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if session.last_used + self.ttl <= time.time():
+            del self.sessions[session_id]
+            self.expired += 1
+            return None
+        self.sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        return session
+
+    def history(self, session_id):
+        """(summary, turns) of a session, ("", []) for an unknown or expired session"""
+        if session_id is None:
+            return "", []
+        with self.lock:
+            session = self._get(session_id)
+            if session is None:
+                return "", []
+            return session.summary, list(session.turns)
+
+    def messages(self, session_id) -> list:
+        """The session as chat messages ({"role", "content"} dicts) to send before the new message"""
+        summary, turns = self.history(session_id)
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        for user, answer in turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def transcript(self, session_id) -> str:
+        """The session as text, to put in front of the task of agents which take a single prompt"""
+        summary, turns = self.history(session_id)
+        if not summary and not turns:
+            return ""
+        lines = ["[Conversation so far]"]
+        if summary:
+            lines.append(f"Summary of the earlier conversation:\n{summary}")
+        for user, answer in turns:
+            lines.append(f"User: {user}\nAssistant: {answer}")
+        return "\n".join(lines) + "\n\n[Current request]\n"
+
+    def add_turn(self, session_id, user, answer):
+        """Record a turn, creating the session if needed"""
+        if session_id is None:
+            return
+        user, answer = str(user), str(answer)
+        with self.lock:
+            session = self._get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self.sessions[session_id] = session
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    self.evicted += 1
+
+            # A single answer longer than the budget (e.g. a long todo table) is cut
+            max_chars = self.max_tokens * 4
+            if len(user) + len(answer) > max_chars:
+                answer = answer[:max(max_chars - len(user), SUMMARY_ANSWER_CHARS)] + "..."
+            session.turns.append((user, answer))
+            session.tokens += estimate_tokens(user) + estimate_tokens(answer)
+
+            # Fold the oldest turns into the summary, always keeping the newest one
+            folded = []
+            while session.tokens > self.max_tokens and len(session.turns) > 1:
+                old_user, old_answer = session.turns.pop(0)
+                session.tokens -= estimate_tokens(old_user) + estimate_tokens(old_answer)
+                folded.append((old_user, old_answer))
+            if folded:
+                summary = self.summarize(session.summary, folded)
+                lines = summary.split("\n")
+                while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.max_tokens // 4:
+                    lines.pop(0)
+                session.summary = "\n".join(lines)
+                self.summarized += len(folded)
+
+    def delete(self, session_id):
+        """Forget a session"""
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        """Counters of the session store"""
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "max_tokens": self.max_tokens,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "summarized_turns": self.summarized,
+            }
@@ -1,8 +1,124 @@
 from smolagents import LiteLLMModel, tool, CodeAgent
-from TodoManager import TodoManager
+from TodoManager import TodoManager, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from EmailManager import EmailManager
-from smolagents.agents import ToolCallingAgent
+from ResponseCache import ResponseCache
+from IntentRouter import IntentRouter
+from SessionStore import SessionStore
+from smolagents.agents import ToolCallingAgent, ToolOutput
+from smolagents.memory import ActionStep, FinalAnswerStep, ToolCall
+from smolagents.models import ChatMessageStreamDelta
+from smolagents.monitoring import TokenUsage
+from dataclasses import replace
 from datetime import datetime
+import contextvars
+import time
+import Tracing
+
+# Shared managers, created once at startup and reused by every tool call
+todo_manager = TodoManager()
+email_manager = EmailManager()
+# Answers shared by all agent instances, see TodoAgent.run
+response_cache = ResponseCache()
+# Plain commands like "complete 12" are executed directly, see TodoAgent.run_intent
+intent_router = IntentRouter()
+# Conversation memory of sessions, shared by all agent instances of the pool
+session_store = SessionStore()
+
+
+def record_usage(attributes: dict, token_usage, first_token_seconds, total_seconds):
+    """
+    Add token counts and speeds to LLM span attributes.
+
+    LiteLLM doesn't pass on Ollama's prompt evaluation and generation times, so
+    the time to the first streamed token stands in for the prompt evaluation and
+    the rest of the call for the generation.
+    """
+    prompt_tokens = token_usage.input_tokens if token_usage else 0
+    generated_tokens = token_usage.output_tokens if token_usage else 0
+    attributes["prompt_tokens"] = prompt_tokens
+    attributes["generated_tokens"] = generated_tokens
+    if first_token_seconds is not None:
+        generation_seconds = total_seconds - first_token_seconds
+        attributes["prompt_eval_ms"] = round(first_token_seconds * 1000, 3)
+        attributes["generation_ms"] = round(generation_seconds * 1000, 3)
+        if first_token_seconds > 0:
+            attributes["prompt_tokens_per_s"] = round(prompt_tokens / first_token_seconds, 1)
+        if generation_seconds > 0:
+            attributes["gen_tokens_per_s"] = round(generated_tokens / generation_seconds, 1)
+        Tracing.observe("llm.prompt_eval", first_token_seconds)
+        Tracing.observe("llm.generation", generation_seconds)
+    Tracing.count("llm_prompt_tokens", prompt_tokens)
+    Tracing.count("llm_generated_tokens", generated_tokens)
+
+
+class TracedLiteLLMModel(LiteLLMModel):
+    """LiteLLMModel recording an "llm.generate" span with the token counts of every call"""
+
+    def generate(self, messages, *args, **kwargs):
+        with Tracing.span("llm.generate", model=self.model_id, stream=False) as attributes:
+            start = time.perf_counter()
+            message = super().generate(messages, *args, **kwargs)
+            record_usage(attributes, message.token_usage, None, time.perf_counter() - start)
+            return message
+
+    def generate_stream(self, messages, *args, **kwargs):
+        with Tracing.span("llm.generate", model=self.model_id, stream=True) as attributes:
+            start = time.perf_counter()
+            first_token = None
+            input_tokens = output_tokens = 0
+            for delta in super().generate_stream(messages, *args, **kwargs):
+                if first_token is None and (delta.content or delta.tool_calls):
+                    first_token = time.perf_counter() - start
+                if delta.token_usage:
+                    input_tokens += delta.token_usage.input_tokens
+                    output_tokens += delta.token_usage.output_tokens
+                yield delta
+            record_usage(attributes, TokenUsage(input_tokens, output_tokens), first_token, time.perf_counter() - start)
+
+
+class OrderedToolCallingAgent(ToolCallingAgent):
+    """
+    ToolCallingAgent which only runs tool calls of a step in parallel when they are read-only.
+
+    The tool calls of a step are split into runs of consecutive read-only tools,
+    which execute concurrently on the agent's thread pool, and tools with side
+    effects, which execute alone and in the order the model gave them.
+    Tool calls run in a copy of the step's context, so their spans (including
+    the storage spans) join the request's trace on any thread.
+    """
+    tool_context = None
+
+    def process_tool_calls(self, chat_message, memory_step):
+        self.tool_context = contextvars.copy_context()
+        groups = []
+        for tool_call in chat_message.tool_calls:
+            parallel = getattr(self.tools.get(tool_call.function.name), "read_only", False)
+            if groups and parallel and groups[-1][0]:
+                groups[-1][1].append(tool_call)
+            else:
+                groups.append((parallel, [tool_call]))
+
+        max_tool_threads = self.max_tool_threads
+        tool_calls = []
+        try:
+            for parallel, group in groups:
+                self.max_tool_threads = max_tool_threads if parallel else 1
+                if memory_step.observations:
+                    memory_step.observations += "\n"
+                yield from super().process_tool_calls(replace(chat_message, tool_calls=group), memory_step)
+                tool_calls.extend(memory_step.tool_calls)
+        finally:
+            self.max_tool_threads = max_tool_threads
+        memory_step.tool_calls = tool_calls
+
+    def execute_tool_call(self, tool_name, arguments):
+        if self.tool_context is None:
+            return self.traced_tool_call(tool_name, arguments)
+        return self.tool_context.copy().run(self.traced_tool_call, tool_name, arguments)
+
+    def traced_tool_call(self, tool_name, arguments):
+        with Tracing.span(f"tool.{tool_name}"):
+            return super().execute_tool_call(tool_name, arguments)
 
 
 # Create tool functions that wrap your TodoManager methods
@@ -16,10 +132,6 @@ def add_todo_task(task: str, description: str, due_date: str, due_time: str) ->
         due_date: Due date in YYYY-MM-DD format
         due_time: Due time in HH:MM format
     """
-    todo_manager = TodoManager()
-    email_manager = EmailManager()
-
-
     new_id = todo_manager.add_todo(task, description, due_date, due_time)
     if new_id != -1:
         email_manager.send_email("New Todo Added",
@@ -29,16 +141,57 @@ def add_todo_task(task: str, description: str, due_date: str, due_time: str) ->
     return "Failed to add todo"
 
 @tool
-def list_all_todos(status: str = None) -> str:
+def add_todo_tasks(todos: list) -> str:
     """
-    List todos, optionally filtered by status (pending, completed)
+    Add several todo items at once. Use this instead of calling add_todo_task repeatedly.
+    Args:
+        todos: List of todos, each a dict with "task", "description", "due_date" (YYYY-MM-DD) and "due_time" (HH:MM)
+    """
+    new_ids = todo_manager.add_todos(todos)
+    if not new_ids:
+        return "Failed to add todos"
+
+    # One summary email for the whole batch
+    body = f"{len(new_ids)} new todos have been added:\n\n"
+    for todo in todos:
+        body += f"Task: {todo['task']}\nDescription: {todo.get('description', '')}\nDue Date: {todo['due_date']}\nDue Time: {todo['due_time']}\n\n"
+    email_manager.send_email("New Todos Added", body)
+
+    return f"{len(new_ids)} todos added successfully with IDs {', '.join(str(new_id) for new_id in new_ids)}"
+
+@tool
+def list_all_todos(status: str = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, due_from: str = None,
+                   due_to: str = None, text: str = None, columns: str = None, compact: bool = True) -> str:
+    """
+    List todos, optionally filtered by status (pending, completed), due date range or text.
+    Results are paginated: when there are more todos the response tells which offset to use for the next page.
     Args:
         status: Filter todos by status (optional)
         - If None, lists all todos
+        limit: Maximum number of todos to return (default 20, at most 100)
+        offset: Number of matching todos to skip, for the next page
+        due_from: Only todos due on or after this date, in YYYY-MM-DD format (optional)
+        due_to: Only todos due on or before this date, in YYYY-MM-DD format (optional)
+        text: Only todos whose task or description contains this text (optional)
+        columns: Comma-separated columns to return, e.g. "id,task,due_date" (optional, default all)
+        compact: If True, return one "|"-separated line per todo instead of an aligned table
+
+    """
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    return todo_manager.list_todos(status, limit, offset, due_from, due_to, text, columns, compact)
+
+@tool
+def search_todos(query: str, limit: int = 5, status: str = None) -> str:
+    """
+    Find todos by words from their task or description, e.g. to get the ID of the todo the user means.
+    Tolerates typos and partial words. Use this instead of listing all todos when the user didn't give a todo ID.
+    Args:
+        query: Words describing the todo, e.g. "groceries"
+        limit: Maximum number of matches to return (default 5)
+        status: Only return todos with this status (pending, completed) (optional)
 
     """
-    todo_manager = TodoManager()
-    return todo_manager.list_todos(status)
+    return todo_manager.search_todos(query, limit, status)
 
 @tool
 def complete_todo_task(todo_id: int) -> str:
@@ -48,7 +201,6 @@ def complete_todo_task(todo_id: int) -> str:
         todo_id: The ID of the todo to mark as completed
 
     """
-    todo_manager = TodoManager()
     return todo_manager.complete_todo(todo_id)
 
 @tool
@@ -59,9 +211,35 @@ def delete_todo_task(todo_id: int) -> str:
         todo_id: The ID of the todo to delete
 
     """
-    todo_manager = TodoManager()
     return todo_manager.delete_todo(todo_id)
 
+@tool
+def complete_todo_tasks(todo_ids: list = None, due_from: str = None, due_to: str = None, text: str = None) -> str:
+    """
+    Mark several todos as completed at once, either by their IDs or all pending todos matching the filters,
+    e.g. due_from and due_to set to yesterday's date to complete everything due yesterday.
+    Args:
+        todo_ids: IDs of the todos to mark as completed (optional)
+        due_from: Complete pending todos due on or after this date, in YYYY-MM-DD format (optional)
+        due_to: Complete pending todos due on or before this date, in YYYY-MM-DD format (optional)
+        text: Complete pending todos whose task or description contains this text (optional)
+
+    """
+    return todo_manager.complete_todos(todo_ids, due_from, due_to, text)
+
+@tool
+def delete_todo_tasks(todo_ids: list = None, due_from: str = None, due_to: str = None, text: str = None) -> str:
+    """
+    Delete several todos at once, either by their IDs or all todos matching the filters.
+    Args:
+        todo_ids: IDs of the todos to delete (optional)
+        due_from: Delete todos due on or after this date, in YYYY-MM-DD format (optional)
+        due_to: Delete todos due on or before this date, in YYYY-MM-DD format (optional)
+        text: Delete todos whose task or description contains this text (optional)
+
+    """
+    return todo_manager.delete_todos(todo_ids, due_from, due_to, text)
+
 @tool
 def check_upcoming_todos_task(response: bool) -> str | None:
     """
@@ -72,12 +250,9 @@ def check_upcoming_todos_task(response: bool) -> str | None:
         response: If True, return a text
         - If False, don't return a text, just send email reminders
     """
-    todo_manager = TodoManager()
-    email_reminder = EmailManager()
-
     upcoming_todos = todo_manager.get_upcoming_todos()
     if upcoming_todos:
-        email_reminder.send_reminder(upcoming_todos)
+        email_manager.send_reminder(upcoming_todos)
         if response:
             return f"You have {len(upcoming_todos)} todos upcoming within 24hours. Reminders sent via email."
 
@@ -94,42 +269,161 @@ def get_current_date() -> str:
     """
     return datetime.now().strftime("%Y-%m-%d")
 
+# Tools without side effects, several of them in one step run at the same time (see OrderedToolCallingAgent)
+# check_upcoming_todos_task isn't one of them, every call sends reminder emails
+for read_only_tool in (list_all_todos, search_todos, get_current_date):
+    read_only_tool.read_only = True
+
 class TodoAgent:
     def __init__(self):
-        self.model = LiteLLMModel(
-            model_id="ollama/llama3.1:8b",
-            api_base="http://localhost:11434/api/generate"
-        )
-
-        instructions = ("You are a Todo management assistant."
-                      "You can help users manage their todos, send reminders, and answer questions about their tasks. "
-                      "Use the tools provided to perform actions like adding, listing, completing, and deleting todos."
-                      "After each action, provide a clear response to the user. "
-                      "After each action, also check for upcoming todos tasks without a response."
-                    "If no date is provided and instead time references used for due date get the current date and calculate the due date based on that.")
-
-        self.agent = ToolCallingAgent(
-            tools=[
+        with Tracing.span("agent.setup"):
+            self.model = TracedLiteLLMModel(
+                model_id="ollama/llama3.1:8b",
+                api_base="http://localhost:11434/api/generate"
+            )
+
+            instructions = ("You are a Todo management assistant."
+                          "You can help users manage their todos, send reminders, and answer questions about their tasks. "
+                          "Use the tools provided to perform actions like adding, listing, completing, and deleting todos."
+                          "After each action, provide a clear response to the user. "
+                          "After each action, also check for upcoming todos tasks without a response."
+                          "If the user didn't give a todo ID, use search_todos to find the matching todo and its ID. "
+                          "To add, complete or delete several todos use the batch tools once instead of repeating the single tools. "
+                        "If no date is provided and instead time references used for due date get the current date and calculate the due date based on that.")
+
+            self.instructions = instructions
+            tools = [
                 add_todo_task,
+                add_todo_tasks,
                 list_all_todos,
+                search_todos,
                 complete_todo_task,
+                complete_todo_tasks,
                 delete_todo_task,
+                delete_todo_tasks,
                 check_upcoming_todos_task,
                 get_current_date
-            ],
-            model=self.model,
-            stream_outputs=True,
-            instructions=instructions
-        )
+            ]
+            self.tools = {t.name: t for t in tools}
+            self.agent = OrderedToolCallingAgent(
+                tools=tools,
+                model=self.model,
+                stream_outputs=True,
+                instructions=instructions
+            )
+
+    def run_intent(self, prompt: str):
+        """
+        Answer a plain command like "complete 12" with a direct tool call.
 
-    def run(self, prompt: str) -> str:
+        Returns (intent, answer), or None when the prompt isn't a recognized command
+        or the tool call failed, in which case the agent should handle the prompt.
+        """
+        intent = intent_router.match(prompt)
+        if intent is None:
+            return None
+        try:
+            with Tracing.span(f"tool.{intent.tool}", intent=True):
+                return intent, str(self.tools[intent.tool](**intent.arguments))
+        except Exception as e:
+            print(f"Direct tool call {intent.tool} failed, falling back to the agent: {e}")
+            return None
+
+    def run(self, prompt: str, session_id: str = None) -> str:
         """
         Send a prompt to the Agent and return the response.
 
         Args:
             prompt: The message to send to the Agent.
+            session_id: Conversation the prompt belongs to, its earlier turns are put in front of the task.
 
         Returns:
             The response from the Agent.
+
+        Plain commands recognized by the intent router are executed with a direct
+        tool call instead of the agent loop.
+        Repeated prompts are answered from the response cache as long as the todos
+        haven't changed. An answer is only cached when the todo version was the same
+        before and after the run, i.e. the run didn't change any todos. Answers to
+        follow-ups in a session aren't cached.
         """
-        return self.agent.run(prompt)
\ No newline at end of file
+        routed = self.run_intent(prompt)
+        if routed is not None:
+            session_store.add_turn(session_id, prompt, routed[1])
+            return routed[1]
+
+        transcript = session_store.transcript(session_id)
+        version = todo_manager.version
+        key = None if transcript else response_cache.make_key(self.model.model_id, self.instructions, prompt, version)
+        cached = response_cache.get(key)
+        if cached is not None:
+            session_store.add_turn(session_id, prompt, cached)
+            return cached
+
+        response = self.agent.run(transcript + prompt)
+        self.cache_response(key, version, response)
+        session_store.add_turn(session_id, prompt, response)
+        return response
+
+    @staticmethod
+    def cache_response(key, version, response):
+        """Cache an answer unless the todos changed since `version` was read"""
+        if key is None:
+            return
+        if todo_manager.version == version:
+            response_cache.put(key, str(response))
+        else:
+            response_cache.skip()
+
+    def run_stream(self, prompt: str, session_id: str = None):
+        """
+        Send a prompt to the Agent and yield its progress as it happens.
+
+        Args:
+            prompt: The message to send to the Agent.
+            session_id: Conversation the prompt belongs to, see run.
+
+        Yields:
+            Event dicts with a "type" of "token", "tool_call", "tool_result", "step" or "final".
+            Cached answers (see run) are sent as a single "final" event.
+        """
+        routed = self.run_intent(prompt)
+        if routed is not None:
+            intent, answer = routed
+            session_store.add_turn(session_id, prompt, answer)
+            yield {"type": "tool_call", "name": intent.tool, "arguments": intent.arguments}
+            yield {"type": "tool_result", "name": intent.tool, "output": answer}
+            yield {"type": "final", "text": answer}
+            return
+
+        transcript = session_store.transcript(session_id)
+        version = todo_manager.version
+        key = None if transcript else response_cache.make_key(self.model.model_id, self.instructions, prompt, version)
+        cached = response_cache.get(key)
+        if cached is not None:
+            session_store.add_turn(session_id, prompt, cached)
+            yield {"type": "final", "text": cached, "cached": True}
+            return
+
+        for event in self.agent.run(transcript + prompt, stream=True):
+            if isinstance(event, ChatMessageStreamDelta):
+                if event.content:
+                    yield {"type": "token", "text": event.content}
+            elif isinstance(event, ToolCall):
+                yield {"type": "tool_call", "name": event.name, "arguments": event.arguments}
+            elif isinstance(event, ToolOutput):
+                yield {"type": "tool_result", "name": event.tool_call.name, "output": event.observation}
+            elif isinstance(event, ActionStep):
+                yield {"type": "step", "step": event.step_number}
+            elif isinstance(event, FinalAnswerStep):
+                self.cache_response(key, version, event.output)
+                session_store.add_turn(session_id, prompt, event.output)
+                yield {"type": "final", "text": str(event.output)}
+
+    def interrupt(self):
+        """Stop the current run before its next step, see AgentPool"""
+        self.agent.interrupt()
+
+    def reset(self):
+        """Clear the agent's memory so the instance can be reused for another request"""
+        self.agent.memory.reset()
\ No newline at end of file
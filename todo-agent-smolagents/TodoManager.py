@@ -1,31 +1,112 @@
-import os
+import threading
+import time
 import pandas as pd
 from datetime import datetime, timedelta
+from TodoSearch import TodoSearchIndex
+from TodoStorage import CsvTodoStorage, create_storage
+
+# Page size of the list tools, so a long todo list doesn't flood the LLM context
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
 class TodoManager:
-    def __init__(self, csv_file="todos.csv"):
+    """
+    Todo list operations on top of a storage backend.
+
+    A single instance is meant to be shared by all tool calls of a process;
+    every operation runs under a lock so concurrent calls don't interleave.
+    Listeners registered with add_listener are called after every change,
+    including changes of other processes sharing the storage (see sync).
+    `version` grows with every change, also with changes of other processes
+    sharing the storage, so callers can tell whether the todos
+    changed, e.g. to invalidate cached answers. It starts from the current time,
+    so versions aren't reused after a restart.
+    """
+    def __init__(self, csv_file="todos.csv", storage=None):
         self.csv_file = csv_file
         self.columns = ["id", "task", "description", "due_date", "due_time", "status", "created_at"]
-        self.ensure_csv_exists()
+        if storage is None:
+            storage = create_storage(csv_file=csv_file)
+        self.storage = storage
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.search_index = None
+        self._version = time.time_ns()
+        self.storage_generation = storage.generation()
+
+    def add_listener(self, callback):
+        """
+        Register a callback for todo changes.
+
+        The callback is called as callback(event, todo) where event is one of
+        "added", "completed" or "deleted" and todo is a dict with at least the "id",
+        or "reset" with todo None when the whole table was replaced, so listeners
+        have to reload all todos.
+        """
+        self.listeners.append(callback)
+
+    def notify(self, event, todo):
+        """
+        Call all registered listeners for a change, then bump the version.
+
+        Called with the lock held, right after the storage write, so listeners get
+        the changes in the order they were written, and an answer cached for the
+        new version is never built from a listener state older than it.
+        """
+        with self.lock:
+            for callback in self.listeners:
+                try:
+                    callback(event, todo)
+                except Exception as e:
+                    print(f"Error in todo listener: {e}")
+            self._version += 1
+
+    @property
+    def version(self) -> int:
+        """Current version of the todos, after picking up changes of other processes"""
+        with self.lock:
+            self.sync()
+            return self._version
+
+    def sync(self):
+        """
+        Pick up changes another process made to the storage.
+
+        The storage reloads them on its own, but listeners never saw them, so they
+        get a "reset" event and the version grows like after any other change.
+        """
+        with self.lock:
+            generation = self.storage.generation()
+            if generation != self.storage_generation:
+                self.storage_generation = generation
+                self.notify("reset", None)
+
+    def close(self):
+        """Flush pending writes of the storage backend"""
+        with self.lock:
+            self.storage.close()
 
     def ensure_csv_exists(self):
         """Create CSV file if it doesn't exist"""
-        if not os.path.exists(self.csv_file):
-            df = pd.DataFrame(columns=self.columns)
-            df.to_csv(self.csv_file, index=False)
+        if isinstance(self.storage, CsvTodoStorage):
+            self.storage.ensure_csv_exists()
 
     def load_todos(self):
-        """Load todos from CSV file"""
+        """Load todos from the storage backend"""
         try:
-            return pd.read_csv(self.csv_file)
+            with self.lock:
+                self.sync()
+                return self.storage.load()
         except Exception as e:
             print(f"Error loading todos: {e}")
             return pd.DataFrame(columns=self.columns)
 
     def save_todos(self, df) -> bool:
-        """Save todos to CSV file"""
+        """Replace all todos in the storage backend"""
         try:
-            df.to_csv(self.csv_file, index=False)
+            with self.lock:
+                self.storage.save(df)
+                self.notify("reset", None)
             return True
         except Exception as e:
             print(f"Error saving todos: {e}")
@@ -33,72 +114,248 @@ class TodoManager:
 
     def add_todo(self, task, description, due_date, due_time) -> int:
         """Add a new todo item"""
-        df = self.load_todos()
-        new_id = len(df) + 1 if len(df) > 0 else 1
-
-        new_todo = {
-            "id": new_id,
-            "task": task,
-            "description": description,
-            "due_date": due_date,
-            "due_time": due_time,
-            "status": "pending",
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-        df = pd.concat([df, pd.DataFrame([new_todo])], ignore_index=True)
-        if self.save_todos(df):
+        try:
+            with self.lock:
+                self.sync()
+                new_id = self.storage.next_id()
+
+                new_todo = {
+                    "id": new_id,
+                    "task": task,
+                    "description": description,
+                    "due_date": due_date,
+                    "due_time": due_time,
+                    "status": "pending",
+                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+
+                self.storage.add(new_todo)
+                self.notify("added", new_todo)
             return int(new_id)
-        return -1
+        except Exception as e:
+            print(f"Error adding todo: {e}")
+            return -1
+
+    def add_todos(self, todos) -> list:
+        """
+        Add several todos with a single storage write.
+
+        todos is a list of dicts with task, description, due_date and due_time.
+        Returns the new IDs, or an empty list if the todos couldn't be added.
+        """
+        if not todos:
+            return []
+        try:
+            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            new_todos = [
+                {
+                    "id": None,
+                    "task": todo['task'],
+                    "description": todo.get('description', ""),
+                    "due_date": todo['due_date'],
+                    "due_time": todo['due_time'],
+                    "status": "pending",
+                    "created_at": created_at
+                }
+                for todo in todos
+            ]
+            with self.lock:
+                self.sync()
+                new_ids = self.storage.next_ids(len(new_todos))
+                for new_id, todo in zip(new_ids, new_todos):
+                    todo['id'] = new_id
+                self.storage.add_many(new_todos)
+                for todo in new_todos:
+                    self.notify("added", todo)
+            return [int(new_id) for new_id in new_ids]
+        except Exception as e:
+            print(f"Error adding todos: {e}")
+            return []
 
-    def list_todos(self, status=None) -> str:
-        """List todos, optionally filtered by status"""
-        df = self.load_todos()
+    def select_todo_ids(self, todo_ids=None, status=None, due_from=None, due_to=None, text=None) -> list:
+        """
+        IDs for a batch operation: the given todo_ids, or else the IDs of all todos
+        matching the filters. Returns an empty list when neither is given.
+        """
+        if todo_ids:
+            return [int(todo_id) for todo_id in todo_ids]
+        if not (due_from or due_to or text):
+            return []
+        with self.lock:
+            self.sync()
+            df, _ = self.storage.query(status, due_from=due_from, due_to=due_to, text=text)
+        return df['id'].astype(int).tolist()
+
+    def complete_todos(self, todo_ids=None, due_from=None, due_to=None, text=None) -> str:
+        """Mark several todos as completed with a single storage write, by ID or by filters"""
+        try:
+            with self.lock:
+                self.sync()
+                selected = self.select_todo_ids(todo_ids, 'pending', due_from, due_to, text)
+                if not selected:
+                    return "No todos selected, give todo IDs or a filter matching pending todos"
+                completed = self.storage.set_status_many(selected, 'completed')
+                for todo_id in completed:
+                    self.notify("completed", {"id": todo_id})
+        except Exception as e:
+            print(f"Error completing todos: {e}")
+            return "Failed to complete todos"
+        return self.batch_summary("marked as completed", completed, selected)
+
+    def delete_todos(self, todo_ids=None, due_from=None, due_to=None, text=None) -> str:
+        """Delete several todos with a single storage write, by ID or by filters"""
+        try:
+            with self.lock:
+                self.sync()
+                selected = self.select_todo_ids(todo_ids, None, due_from, due_to, text)
+                if not selected:
+                    return "No todos selected, give todo IDs or a filter matching todos"
+                deleted = self.storage.delete_many(selected)
+                for todo_id in deleted:
+                    self.notify("deleted", {"id": todo_id})
+        except Exception as e:
+            print(f"Error deleting todos: {e}")
+            return "Failed to delete todos"
+        return self.batch_summary("deleted", deleted, selected)
+
+    @staticmethod
+    def batch_summary(action, done, selected) -> str:
+        """Result message of a batch operation"""
+        summary = f"{len(done)} todo(s) {action}"
+        if done:
+            summary += f": IDs {', '.join(str(todo_id) for todo_id in done)}"
+        done_ids = set(done)
+        missing = [todo_id for todo_id in selected if todo_id not in done_ids]
+        if missing:
+            summary += f". Not found: IDs {', '.join(str(todo_id) for todo_id in missing)}"
+        return summary
+
+    def list_todos(self, status=None, limit=None, offset=0, due_from=None, due_to=None, text=None,
+                   columns=None, compact=False) -> str:
+        """
+        List todos matching the filters, one page at a time.
+
+        Args:
+            status: Only todos with this status (pending, completed)
+            limit: Maximum number of todos to return, all if None
+            offset: Number of matching todos to skip
+            due_from: Only todos due on or after this YYYY-MM-DD date
+            due_to: Only todos due on or before this YYYY-MM-DD date
+            text: Only todos whose task or description contains this text
+            columns: Columns to include, as a list or comma-separated string
+            compact: Return one "|"-separated line per todo instead of an aligned table
+        """
+        if isinstance(columns, str):
+            columns = [column.strip() for column in columns.split(",") if column.strip()]
+        if columns:
+            unknown = [column for column in columns if column not in self.columns]
+            if unknown:
+                return f"Unknown columns: {', '.join(unknown)}. Available columns: {', '.join(self.columns)}"
+        offset = max(int(offset or 0), 0)
+        if limit is not None:
+            limit = max(int(limit), 0)
+
+        try:
+            with self.lock:
+                self.sync()
+                df, total = self.storage.query(status, due_from=due_from, due_to=due_to, text=text,
+                                               limit=limit, offset=offset)
+        except Exception as e:
+            print(f"Error loading todos: {e}")
+            return "No todos found"
         if df.empty:
+            if total:
+                return f"No todos found at offset {offset}, there are {total} matching todos"
             return "No todos found"
 
-        if status:
-            df = df[df['status'] == status]
+        if columns:
+            df = df[columns]
+        if compact:
+            output = df.to_csv(index=False, sep="|", lineterminator="\n").rstrip("\n")
+        else:
+            output = df.to_string(index=False)
+
+        end = offset + len(df)
+        if offset or end < total:
+            header = f"Showing todos {offset + 1}-{end} of {total}."
+            if end < total:
+                header += f" Use offset={end} to see more."
+            output = header + "\n" + output
+        return output
 
-        return df.to_string(index=False)
+    def search_todos(self, query, limit=5, status=None) -> str:
+        """
+        Find the todos whose task or description best match the query.
+
+        The search index is built on first use and kept up to date through listeners.
+        Returns one "|"-separated line per match, best match first, with a score between 0 and 1.
+        """
+        try:
+            with self.lock:
+                self.sync()
+                if self.search_index is None:
+                    self.search_index = TodoSearchIndex(self)
+            results = self.search_index.search(query, limit=max(int(limit or 5), 1), status=status)
+        except Exception as e:
+            print(f"Error searching todos: {e}")
+            return "No matching todos found"
+        if not results:
+            return "No matching todos found"
+
+        lines = ["id|task|due_date|due_time|status|score"]
+        for score, todo in results:
+            lines.append(f"{todo['id']}|{todo['task']}|{todo['due_date']}|{todo['due_time']}|{todo['status']}|{score}")
+        return "\n".join(lines)
 
     def complete_todo(self, todo_id) -> str:
         """Mark a todo as completed"""
-        df = self.load_todos()
-        if todo_id in df['id'].values:
-            df.loc[df['id'] == todo_id, 'status'] = 'completed'
-            if self.save_todos(df):
+        try:
+            with self.lock:
+                self.sync()
+                completed = self.storage.set_status(todo_id, 'completed')
+                if completed:
+                    self.notify("completed", {"id": todo_id})
+            if completed:
                 return f"Todo with ID {todo_id} marked as completed"
+        except Exception as e:
+            print(f"Error completing todo: {e}")
         return f"Todo with ID {todo_id} not found"
 
     def delete_todo(self, todo_id) -> str:
         """Delete a todo"""
-        df = self.load_todos()
-        if todo_id in df['id'].values:
-            df = df[df['id'] != todo_id]
-            if self.save_todos(df):
+        try:
+            with self.lock:
+                self.sync()
+                deleted = self.storage.delete(todo_id)
+                if deleted:
+                    self.notify("deleted", {"id": todo_id})
+            if deleted:
                 return f"Todo with ID {todo_id} deleted successfully"
+        except Exception as e:
+            print(f"Error deleting todo: {e}")
         return f"Todo with ID {todo_id} not found"
 
-    def get_upcoming_todos(self):
-        """Get todos due within the next 24 hours"""
-        df = self.load_todos()
-        if df.empty:
+    def get_upcoming_todos(self, hours=24):
+        """Get pending todos due within the next `hours` hours (overdue ones included)"""
+        deadline = datetime.now() + timedelta(hours=hours)
+        try:
+            with self.lock:
+                self.sync()
+                df = self.storage.pending_due_before(deadline)
+        except Exception as e:
+            print(f"Error loading todos: {e}")
             return []
 
-        upcoming = []
-        now = datetime.now()
+        return df.to_dict('records')
 
-        for _, todo in df.iterrows():
-            if todo['status'] == 'pending':
-                try:
-                    due_datetime = datetime.strptime(f"{todo['due_date']} {todo['due_time']}", "%Y-%m-%d %H:%M")
-                    time_diff = due_datetime - now
-
-                    # Check if due within 24 hours
-                    if time_diff < timedelta(hours=24):
-                        upcoming.append(todo)
-                except Exception as e:
-                    print(f"Error parsing date for todo {todo['id']}: {e}")
+    def get_pending_todos(self):
+        """Get all pending todos"""
+        try:
+            with self.lock:
+                self.sync()
+                df = self.storage.list('pending')
+        except Exception as e:
+            print(f"Error loading todos: {e}")
+            return []
 
-        return upcoming
\ No newline at end of file
+        return df.to_dict('records')
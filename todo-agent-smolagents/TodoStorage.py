@@ -0,0 +1,748 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import Tracing
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where only one process may use a CSV store
+    fcntl = None
+
+COLUMNS = ["id", "task", "description", "due_date", "due_time", "status", "created_at"]
+DUE_FORMAT = "%Y-%m-%d %H:%M"
+# CSV store: seconds to collect log records into one fsync, and log size that triggers compaction
+FSYNC_INTERVAL = 0.05
+COMPACT_AFTER = 1000
+# and number of IDs reserved in the .seq file at a time
+ID_BLOCK = 100
+
+
+def parse_due(df) -> pd.Series:
+    """Parse due_date + due_time of all rows at once, invalid values become NaT"""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype="datetime64[ns]")
+    due = df['due_date'].astype(str) + " " + df['due_time'].astype(str)
+    parsed = pd.to_datetime(due, format=DUE_FORMAT, errors="coerce")
+    invalid = parsed.isna()
+    if invalid.any():
+        print(f"Error parsing date for todos {df.loc[invalid, 'id'].tolist()}")
+    return parsed
+
+
+def filter_todos(df, status=None, due_from=None, due_to=None, text=None) -> pd.DataFrame:
+    """
+    Return the rows matching all given filters.
+
+    due_from/due_to are inclusive YYYY-MM-DD dates, text is matched
+    case-insensitively against task and description.
+    """
+    mask = pd.Series(True, index=df.index)
+    if status:
+        mask &= df['status'] == status
+    if due_from:
+        mask &= df['due_date'].astype(str) >= due_from
+    if due_to:
+        mask &= df['due_date'].astype(str) <= due_to
+    if text:
+        mask &= (df['task'].astype(str).str.contains(text, case=False, regex=False)
+                 | df['description'].astype(str).str.contains(text, case=False, regex=False))
+    return df[mask]
+
+
+class TodoStorage:
+    """Base class for todo storage backends used by TodoManager"""
+    columns = COLUMNS
+
+    def load(self) -> pd.DataFrame:
+        """Return all todos as a DataFrame"""
+        raise NotImplementedError
+
+    def save(self, df) -> None:
+        """Replace all stored todos with the given DataFrame"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Return the number of stored todos"""
+        return len(self.load())
+
+    def list(self, status=None) -> pd.DataFrame:
+        """Return todos, optionally filtered by status"""
+        df = self.load()
+        if status:
+            df = df[df['status'] == status]
+        return df
+
+    def query(self, status=None, due_from=None, due_to=None, text=None, limit=None, offset=0):
+        """Return one page of matching todos in stored order and the total number of matches"""
+        df = filter_todos(self.list(status), due_from=due_from, due_to=due_to, text=text)
+        end = None if limit is None else offset + limit
+        return df.iloc[offset:end], len(df)
+
+    def pending_due_before(self, deadline) -> pd.DataFrame:
+        """Return pending todos due before the given datetime, earliest first"""
+        df = self.list('pending')
+        due = parse_due(df).dropna().sort_values()
+        return df.loc[due.index[due < deadline]]
+
+    def next_id(self) -> int:
+        """Allocate a new unique todo ID from the persistent sequence"""
+        raise NotImplementedError
+
+    def generation(self) -> int:
+        """Counter that changes whenever another process changed the stored todos"""
+        return 0
+
+    def add(self, todo: dict) -> None:
+        """Insert a single todo row"""
+        raise NotImplementedError
+
+    def set_status(self, todo_id, status) -> bool:
+        """Update the status of a todo, returns False if it doesn't exist"""
+        raise NotImplementedError
+
+    def delete(self, todo_id) -> bool:
+        """Delete a todo, returns False if it doesn't exist"""
+        raise NotImplementedError
+
+    def next_ids(self, count) -> list:
+        """Allocate `count` new unique todo IDs"""
+        return [self.next_id() for _ in range(count)]
+
+    def add_many(self, todos) -> None:
+        """Insert several todo rows in one write"""
+        for todo in todos:
+            self.add(todo)
+
+    def set_status_many(self, todo_ids, status) -> list:
+        """Update the status of several todos in one write, returns the IDs that exist"""
+        return [todo_id for todo_id in todo_ids if self.set_status(todo_id, status)]
+
+    def delete_many(self, todo_ids) -> list:
+        """Delete several todos in one write, returns the IDs that existed"""
+        return [todo_id for todo_id in todo_ids if self.delete(todo_id)]
+
+    def close(self) -> None:
+        """Flush pending writes and release the backend's resources"""
+
+
+class CsvTodoStorage(TodoStorage):
+    """
+    Stores todos in a CSV snapshot plus an append-only operation log.
+
+    Every change appends one JSON record ("add", "status" or "delete", each for
+    one or more todos) to "<csv_file>.log" instead of rewriting the CSV, so a write
+    costs a few bytes regardless of the number of todos. A background thread fsyncs appended records
+    in batches and compacts the log into a new snapshot once it holds
+    `compact_after` records: the table is written to a temp file, fsync'd and
+    atomically renamed over the CSV, so readers never see a partial file.
+    On start the log is replayed on top of the last snapshot. Replaying is
+    idempotent, which also covers a crash between the rename and the log truncation.
+
+    The current rows are kept in memory in a dict by ID, so a write only touches
+    the rows it changes; the DataFrame handed to readers is built from them
+    when it is first needed after a change. They are reloaded when the snapshot
+    or log changes on disk, e.g. when it was edited by another process. Processes
+    sharing the files serialize appends, compaction and ID allocation with an
+    exclusive lock on "<csv_file>.lock" (POSIX only).
+    IDs are reserved `id_block` at a time in a small "<csv_file>.seq" file next
+    to it, so the file is only rewritten once per block; IDs of a block left
+    unused when the process stops are skipped.
+    Due times of pending todos are parsed once per table version into a sorted
+    index, so upcoming todos are found with a binary search.
+    """
+
+    def __init__(self, csv_file="todos.csv", fsync_interval=FSYNC_INTERVAL, compact_after=COMPACT_AFTER,
+                 id_block=ID_BLOCK):
+        self.csv_file = csv_file
+        self.log_file = csv_file + ".log"
+        self.seq_file = csv_file + ".seq"
+        self.lock_file = csv_file + ".lock"
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.id_block = id_block
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.compact_lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_depth = 0
+        self._rows = None
+        self._df = None
+        self._stamp = None
+        self._due_index = None
+        self._log = None
+        self._log_records = 0
+        self._unsynced = 0
+        self._worker = None
+        self._closed = False
+        self._generation = 0
+        # Reserved IDs not handed out yet: _next_id up to _reserved
+        self._next_id = 1
+        self._reserved = 0
+        with self.lock, self._file_lock():
+            self.ensure_csv_exists()
+            self._reload(repair=True)
+        atexit.register(self.close)
+
+    def ensure_csv_exists(self):
+        """Create CSV file if it doesn't exist"""
+        if not os.path.exists(self.csv_file):
+            self._write_snapshot(pd.DataFrame(columns=self.columns))
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with other processes using the same files; must be called with the lock held"""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        # flock isn't reentrant within a process, so only the outermost use takes and releases it
+        if not self._lock_depth:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if not self._lock_depth:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _file_stamp(self):
+        stamp = []
+        for path in (self.csv_file, self.log_file):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _fsync_dir(self):
+        """Make a rename in the storage directory durable (not supported on Windows)"""
+        if os.name != "posix":
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.csv_file)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_file(self, path, df):
+        with open(path, "w", newline="") as f:
+            df.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, df):
+        """Write the table to a temp file and atomically rename it over the CSV"""
+        with Tracing.span("csv.save", rows=len(df)):
+            tmp_file = self.csv_file + ".tmp"
+            self._write_file(tmp_file, df)
+            os.replace(tmp_file, self.csv_file)
+            self._fsync_dir()
+
+    def _read_log(self):
+        """Return the records in the log and the offset after the last complete one"""
+        records = []
+        offset = 0
+        try:
+            with open(self.log_file, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        return records, offset
+
+    @staticmethod
+    def _apply(rows, record) -> None:
+        """Apply a log record to the rows in place, applying it twice has no further effect"""
+        op = record['op']
+        if op == 'add':
+            for todo in record['todos']:
+                rows.setdefault(int(todo['id']), dict(todo))
+        elif op == 'status':
+            for todo_id in record['ids']:
+                if todo_id in rows:
+                    rows[todo_id]['status'] = record['status']
+        elif op == 'delete':
+            for todo_id in record['ids']:
+                rows.pop(todo_id, None)
+        else:
+            raise ValueError(f"Unknown todo log operation: {op}")
+
+    def _reload(self, repair=False):
+        """Rebuild the rows from the snapshot and the log"""
+        with Tracing.span("csv.load") as attributes:
+            rows = {int(todo['id']): todo for todo in pd.read_csv(self.csv_file).to_dict('records')}
+            records, offset = self._read_log()
+            for record in records:
+                self._apply(rows, record)
+            attributes.update(rows=len(rows), log_records=len(records))
+        if repair and os.path.exists(self.log_file) and os.path.getsize(self.log_file) > offset:
+            # Drop a record that was only partly written when the process died
+            print(f"Discarding incomplete record at the end of {self.log_file}")
+            with open(self.log_file, "r+b") as f:
+                f.truncate(offset)
+        self._rows = rows
+        self._df = None
+        self._log_records = len(records)
+        self._stamp = self._file_stamp()
+        self._due_index = None
+
+    def _current_rows(self) -> dict:
+        """Return the rows by ID, reloading them if the files changed on disk"""
+        with self.lock:
+            if self._rows is None or self._file_stamp() != self._stamp:
+                with self._file_lock():
+                    self._reload()
+                self._generation += 1
+            return self._rows
+
+    def _frame(self) -> pd.DataFrame:
+        """Return the current table, building it from the rows after a change; callers must not modify it"""
+        with self.lock:
+            rows = self._current_rows()
+            if self._df is None:
+                self._df = pd.DataFrame(list(rows.values()), columns=self.columns)
+            return self._df
+
+    def _pending_due_index(self) -> pd.Series:
+        """Sorted due datetimes of pending todos, indexed by row label of the cached table"""
+        with self.lock:
+            df = self._frame()
+            if self._due_index is None:
+                pending = df[df['status'] == 'pending']
+                self._due_index = parse_due(pending).dropna().sort_values()
+            return self._due_index
+
+    def _log_replaced(self) -> bool:
+        """Whether the open log was replaced by a compaction or save of another process"""
+        try:
+            return os.fstat(self._log.fileno()).st_ino != os.stat(self.log_file).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _append(self, record):
+        """Append a record to the log and apply it to the rows; must be called with the file lock held"""
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self.lock:
+            rows = self._current_rows()
+            if self._log is not None and self._log_replaced():
+                self._log.close()
+                self._log = None
+            if self._log is None:
+                self._log = open(self.log_file, "ab")
+            self._log.write(line)
+            self._log.flush()
+            self._apply(rows, record)
+            self._df = None
+            self._due_index = None
+            self._stamp = self._file_stamp()
+            self._log_records += 1
+            self._unsynced += 1
+            if not self._closed and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self.run, name="todo-log", daemon=True)
+                self._worker.start()
+            self.condition.notify()
+
+    def run(self):
+        """Background thread: fsync the log in batches and compact it when it grows"""
+        while True:
+            with self.condition:
+                while not self._closed and not self._unsynced:
+                    self.condition.wait()
+                if self._closed:
+                    return
+            # Let records written meanwhile join this batch
+            time.sleep(self.fsync_interval)
+            try:
+                self.sync()
+                if self._log_records >= self.compact_after:
+                    self.compact()
+            except Exception as e:
+                print(f"Error writing todo log: {e}")
+
+    def sync(self):
+        """fsync all records appended so far"""
+        with self.lock:
+            if self._log is None or not self._unsynced:
+                return
+            fd = os.dup(self._log.fileno())
+            records = self._unsynced
+            self._unsynced = 0
+        try:
+            with Tracing.span("csv.fsync", records=records):
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def compact(self):
+        """Write the current table as a new snapshot and drop the log records it contains"""
+        with self.compact_lock:
+            with self.lock, self._file_lock():
+                df = self._frame()
+                if not self._log_records:
+                    return
+                stat = os.stat(self.log_file)
+
+            # The slow part runs without the locks, writes keep appending to the log meanwhile
+            tmp_file = f"{self.csv_file}.{os.getpid()}.tmp"
+            with Tracing.span("csv.compact", rows=len(df)):
+                self._write_file(tmp_file, df)
+
+            with self.lock, self._file_lock():
+                try:
+                    replaced = os.stat(self.log_file).st_ino != stat.st_ino
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    # Another process compacted or saved meanwhile, the snapshot is outdated
+                    os.remove(tmp_file)
+                    return
+                # Pick up records other processes appended meanwhile before taking the new stamp
+                self._current_rows()
+                os.replace(tmp_file, self.csv_file)
+                if self._log is not None:
+                    self._log.close()
+                    self._log = None
+                # Keep the records appended while the snapshot was written
+                with open(self.log_file, "rb") as f:
+                    f.seek(stat.st_size)
+                    tail = f.read()
+                tmp_log = self.log_file + ".tmp"
+                with open(tmp_log, "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_log, self.log_file)
+                self._fsync_dir()
+                self._log_records = tail.count(b"\n")
+                self._unsynced = 0
+                self._stamp = self._file_stamp()
+
+    def close(self):
+        """Stop the background thread, fsync the log and compact it into the snapshot"""
+        with self.condition:
+            if self._closed:
+                return
+            self._closed = True
+            self.condition.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+        self.sync()
+        self.compact()
+        with self.lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def load(self) -> pd.DataFrame:
+        return self._frame().copy()
+
+    def save(self, df) -> None:
+        with self.compact_lock, self.lock, self._file_lock():
+            self._write_snapshot(df)
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if os.path.exists(self.log_file):
+                os.remove(self.log_file)
+            self._rows = {int(todo['id']): todo for todo in df.to_dict('records')}
+            self._df = None
+            self._log_records = 0
+            self._unsynced = 0
+            self._stamp = self._file_stamp()
+            # New IDs must continue after every ID of the saved table
+            if not df.empty and int(df['id'].max()) > self._read_seq():
+                self._write_seq(int(df['id'].max()))
+            self._next_id, self._reserved = 1, 0
+            self._due_index = None
+
+    def count(self) -> int:
+        return len(self._current_rows())
+
+    def list(self, status=None) -> pd.DataFrame:
+        df = self._frame()
+        if status:
+            return df[df['status'] == status].copy()
+        return df.copy()
+
+    def query(self, status=None, due_from=None, due_to=None, text=None, limit=None, offset=0):
+        # Filter the cached table directly so only the requested page is copied
+        with self.lock:
+            df = filter_todos(self._frame(), status=status, due_from=due_from, due_to=due_to, text=text)
+            end = None if limit is None else offset + limit
+            return df.iloc[offset:end].copy(), len(df)
+
+    def pending_due_before(self, deadline) -> pd.DataFrame:
+        with self.lock:
+            due = self._pending_due_index()
+            end = due.searchsorted(pd.Timestamp(deadline), side="left")
+            return self._frame().loc[due.index[:end]].copy()
+
+    def next_id(self) -> int:
+        return self.next_ids(1)[0]
+
+    def generation(self) -> int:
+        with self.lock:
+            self._current_rows()
+            return self._generation
+
+    def _read_seq(self) -> int:
+        """Last allocated ID, continues after the highest ID in the table if the .seq file is missing or damaged"""
+        try:
+            with open(self.seq_file) as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Empty or partly written after a crash
+            print(f"Ignoring damaged {self.seq_file}")
+        return max(self._current_rows(), default=0)
+
+    def _write_seq(self, last_id):
+        """Durably replace the .seq file"""
+        tmp_file = self.seq_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(str(last_id))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.seq_file)
+        self._fsync_dir()
+
+    def next_ids(self, count) -> list:
+        with self.lock:
+            if self._next_id + count - 1 > self._reserved:
+                with self._file_lock():
+                    last_id = self._read_seq()
+                    self._write_seq(last_id + max(count, self.id_block))
+                self._next_id, self._reserved = last_id + 1, last_id + max(count, self.id_block)
+            new_ids = list(range(self._next_id, self._next_id + count))
+            self._next_id += count
+        return new_ids
+
+    def _existing(self, todo_ids) -> list:
+        """IDs out of todo_ids which are in the table, without duplicates"""
+        rows = self._current_rows()
+        return [todo_id for todo_id in dict.fromkeys(int(todo_id) for todo_id in todo_ids) if todo_id in rows]
+
+    def add(self, todo: dict) -> None:
+        self.add_many([todo])
+
+    def add_many(self, todos) -> None:
+        with self.lock, self._file_lock():
+            self._append({"op": "add", "todos": list(todos)})
+
+    def set_status(self, todo_id, status) -> bool:
+        return bool(self.set_status_many([todo_id], status))
+
+    def set_status_many(self, todo_ids, status) -> list:
+        with self.lock, self._file_lock():
+            found = self._existing(todo_ids)
+            if found:
+                self._append({"op": "status", "ids": found, "status": status})
+            return found
+
+    def delete(self, todo_id) -> bool:
+        return bool(self.delete_many([todo_id]))
+
+    def delete_many(self, todo_ids) -> list:
+        with self.lock, self._file_lock():
+            found = self._existing(todo_ids)
+            if found:
+                self._append({"op": "delete", "ids": found})
+            return found
+
+
+class SqliteTodoStorage(TodoStorage):
+    """Stores todos in an indexed SQLite database so point updates touch a single row"""
+
+    def __init__(self, db_file="todos.db"):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """Create the todos table and its indexes if they don't exist"""
+        with self.conn:
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS todos (
+                    id INTEGER PRIMARY KEY,
+                    task TEXT,
+                    description TEXT,
+                    due_date TEXT,
+                    due_time TEXT,
+                    status TEXT,
+                    created_at TEXT
+                )"""
+            )
+            table_sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'todos'").fetchone()[0]
+            if "PRIMARY KEY" not in table_sql:
+                # Database created before id became the primary key
+                self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_todos_id_unique ON todos (id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_todos_status ON todos (status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_todos_due ON todos (due_date, due_time)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS todo_sequence (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO todo_sequence (name, value) SELECT 'todos', COALESCE(MAX(id), 0) FROM todos"
+            )
+
+    def _query(self, sql, params=()) -> pd.DataFrame:
+        rows = self.conn.execute(sql, params).fetchall()
+        return pd.DataFrame(rows, columns=self.columns)
+
+    def load(self) -> pd.DataFrame:
+        return self._query(f"SELECT {', '.join(self.columns)} FROM todos ORDER BY rowid")
+
+    def save(self, df) -> None:
+        rows = df[self.columns].itertuples(index=False, name=None)
+        with self.conn:
+            self.conn.execute("DELETE FROM todos")
+            self.conn.executemany(
+                f"INSERT INTO todos ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(self.columns))})",
+                rows
+            )
+            self.conn.execute(
+                "UPDATE todo_sequence SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) FROM todos)) WHERE name = 'todos'"
+            )
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM todos").fetchone()[0]
+
+    def list(self, status=None) -> pd.DataFrame:
+        if not status:
+            return self.load()
+        return self._query(
+            f"SELECT {', '.join(self.columns)} FROM todos WHERE status = ? ORDER BY rowid", (status,)
+        )
+
+    def query(self, status=None, due_from=None, due_to=None, text=None, limit=None, offset=0):
+        conditions = []
+        params = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if due_from:
+            conditions.append("due_date >= ?")
+            params.append(due_from)
+        if due_to:
+            conditions.append("due_date <= ?")
+            params.append(due_to)
+        if text:
+            conditions.append("(instr(lower(task), lower(?)) > 0 OR instr(lower(description), lower(?)) > 0)")
+            params += [text, text]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        total = self.conn.execute(f"SELECT COUNT(*) FROM todos {where}", params).fetchone()[0]
+        df = self._query(
+            f"SELECT {', '.join(self.columns)} FROM todos {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset]
+        )
+        return df, total
+
+    def pending_due_before(self, deadline) -> pd.DataFrame:
+        # Range scan on the (due_date, due_time) index, exact times are checked afterwards
+        df = self._query(
+            f"SELECT {', '.join(self.columns)} FROM todos "
+            "WHERE due_date <= ? AND status = 'pending' ORDER BY due_date, due_time",
+            (deadline.strftime("%Y-%m-%d"),)
+        )
+        due = parse_due(df)
+        return df[due < deadline]
+
+    def generation(self) -> int:
+        # Changes with every commit of another connection
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def next_id(self) -> int:
+        with self.conn:
+            self.conn.execute("UPDATE todo_sequence SET value = value + 1 WHERE name = 'todos'")
+            return self.conn.execute("SELECT value FROM todo_sequence WHERE name = 'todos'").fetchone()[0]
+
+    def next_ids(self, count) -> list:
+        with self.conn:
+            self.conn.execute("UPDATE todo_sequence SET value = value + ? WHERE name = 'todos'", (count,))
+            last_id = self.conn.execute("SELECT value FROM todo_sequence WHERE name = 'todos'").fetchone()[0]
+        return list(range(last_id - count + 1, last_id + 1))
+
+    def add(self, todo: dict) -> None:
+        self.add_many([todo])
+
+    def add_many(self, todos) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO todos ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(self.columns))})",
+                [[todo[column] for column in self.columns] for todo in todos]
+            )
+
+    def _existing(self, todo_ids) -> list:
+        """IDs out of todo_ids which are in the table, without duplicates"""
+        todo_ids = [int(todo_id) for todo_id in dict.fromkeys(todo_ids)]
+        rows = self.conn.execute(
+            f"SELECT DISTINCT id FROM todos WHERE id IN ({', '.join('?' * len(todo_ids))})", todo_ids
+        ).fetchall()
+        ids = {row[0] for row in rows}
+        return [todo_id for todo_id in todo_ids if todo_id in ids]
+
+    def set_status(self, todo_id, status) -> bool:
+        with self.conn:
+            cursor = self.conn.execute("UPDATE todos SET status = ? WHERE id = ?", (status, int(todo_id)))
+        return cursor.rowcount > 0
+
+    def delete(self, todo_id) -> bool:
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM todos WHERE id = ?", (int(todo_id),))
+        return cursor.rowcount > 0
+
+    def set_status_many(self, todo_ids, status) -> list:
+        with self.conn:
+            found = self._existing(todo_ids)
+            if found:
+                self.conn.execute(
+                    f"UPDATE todos SET status = ? WHERE id IN ({', '.join('?' * len(found))})", [status] + found
+                )
+        return found
+
+    def delete_many(self, todo_ids) -> list:
+        with self.conn:
+            found = self._existing(todo_ids)
+            if found:
+                self.conn.execute(f"DELETE FROM todos WHERE id IN ({', '.join('?' * len(found))})", found)
+        return found
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def create_storage(kind=None, csv_file="todos.csv", db_file=None) -> TodoStorage:
+    """
+    Create a storage backend by name.
+
+    The backend defaults to the TODO_STORAGE environment variable ("csv" or "sqlite"),
+    and the SQLite database file to TODO_DB_FILE.
+    """
+    kind = (kind or os.getenv("TODO_STORAGE", "csv")).lower()
+    if kind == "csv":
+        return CsvTodoStorage(csv_file)
+    if kind == "sqlite":
+        return SqliteTodoStorage(db_file or os.getenv("TODO_DB_FILE", "todos.db"))
+    raise ValueError(f"Unknown todo storage backend: {kind}")
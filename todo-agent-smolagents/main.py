@@ -1,14 +1,71 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from TodoAgent import TodoAgent
+import json
+import sys
+from TodoAgent import TodoAgent, response_cache, intent_router, session_store
+from AgentPool import AgentPool, AgentPoolFull, AgentPoolTimeout, AgentRunTimeout
+import Tracing
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes to allow React frontend to communicate
 
+# Pre-built agents shared by all requests, sizes and timeouts come from AGENT_POOL_SIZE, AGENT_POOL_TIMEOUT,
+# AGENT_QUEUE_SIZE and AGENT_TIMEOUT
+agent_pool = AgentPool(TodoAgent)
+
+def sse_event(event: dict) -> str:
+    """Format an event dict as a Server-Sent Events message"""
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+def busy_response(e: AgentPoolFull):
+    """429 response asking the client to retry later"""
+    response = jsonify({"error": "Server busy", "message": str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/', methods=['GET'])
 def home():
     return "nothing to see here, move along"
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the agent response cache"""
+    return jsonify(response_cache.stats())
+
+@app.route('/intent-stats', methods=['GET'])
+def intent_stats():
+    """Hit counters of the intent fast-path router"""
+    return jsonify(intent_router.stats())
+
+@app.route('/session-stats', methods=['GET'])
+def session_stats():
+    """Counters of the conversation session store"""
+    return jsonify(session_store.stats())
+
+@app.route('/queue-stats', methods=['GET'])
+def queue_stats():
+    """Busy/waiting/rejected counters of the agent pool"""
+    return jsonify(agent_pool.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Span timings and token counters in the Prometheus text format"""
+    return Response(Tracing.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces', methods=['GET'])
+def traces():
+    """The most recent request traces, newest first"""
+    return jsonify(Tracing.recent_traces())
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def trace_detail(trace_id):
+    """All spans of a recent request, trace_id is returned by /call-agent"""
+    recorded = Tracing.get_trace(trace_id)
+    if recorded is None:
+        return jsonify({"error": "Unknown trace", "message": f"No recent trace {trace_id}"}), 404
+    return jsonify(recorded)
+
 @app.route('/call-agent', methods=['POST'])
 def call_agent():
     try:
@@ -21,14 +78,34 @@ def call_agent():
         if not msg:
             return jsonify({"error": "No message provided"}), 400
         else:
+            # Send the returned session_id with the next message to continue the conversation
+            session_id = data.get('session_id') or session_store.new_id()
 
-            agent = TodoAgent()
-            response = agent.run(msg)
+            with Tracing.trace("call-agent", session_id=session_id) as trace:
+                with agent_pool.agent() as agent:
+                    response = agent.run(msg, session_id)
             # Return JSON response with 'response' key and 'hello' value
             return jsonify({
-                "response": response
+                "response": response,
+                "session_id": session_id,
+                "trace_id": trace.id if trace else None
             })
 
+    except AgentPoolFull as e:
+        return busy_response(e)
+
+    except AgentPoolTimeout as e:
+        return jsonify({
+            "error": "Server busy",
+            "message": str(e)
+        }), 503
+
+    except AgentRunTimeout as e:
+        return jsonify({
+            "error": "Timeout",
+            "message": str(e)
+        }), 504
+
     except Exception as e:
         # Handle any errors and return error response
         return jsonify({
@@ -36,5 +113,40 @@ def call_agent():
             "message": str(e)
         }), 400
 
+@app.route('/call-agent-stream', methods=['POST'])
+def call_agent_stream():
+    """Same as /call-agent but streams the agent's progress as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    msg = data.get('msg', '')
+    if not msg:
+        return jsonify({"error": "No message provided"}), 400
+    session_id = data.get('session_id') or session_store.new_id()
+    try:
+        # Checked before the response starts, so a full queue can still be answered with 429
+        agent_pool.check()
+    except AgentPoolFull as e:
+        return busy_response(e)
+
+    def generate():
+        try:
+            with Tracing.trace("call-agent-stream", session_id=session_id) as trace:
+                with agent_pool.agent() as agent:
+                    for event in agent.run_stream(msg, session_id):
+                        if event["type"] == "final":
+                            event["session_id"] = session_id
+                            event["trace_id"] = trace.id if trace else None
+                        yield sse_event(event)
+        except Exception as e:
+            yield sse_event({"type": "error", "message": str(e)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if "--production" in sys.argv:
+        # Production mode: waitress with enough threads for the running and the waiting requests
+        from waitress import serve
+
+        serve(app, host='0.0.0.0', port=5000, threads=agent_pool.size + agent_pool.max_waiting + 4)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,6 +1,9 @@
 from smolagents import CodeAgent, WebSearchTool, LiteLLMModel, ToolCallingAgent, tool, PythonInterpreterTool
-import io
-import sys
+from smolagents.agents import ToolOutput
+from smolagents.memory import ActionStep, FinalAnswerStep, ToolCall
+from smolagents.models import ChatMessageStreamDelta
+from ScriptExecutor import get_executor
+from CachedWebSearchTool import CachedWebSearchTool
 
 @tool
 def run_script(script: str) -> str:
@@ -11,37 +14,8 @@ def run_script(script: str) -> str:
     """
     print(f"Running script:\n{script}")
 
-    try:
-        # Capture stdout
-        old_stdout = sys.stdout
-        sys.stdout = captured_output = io.StringIO()
-
-        exec_globals = {}
-        exec(script, exec_globals)
-
-        # Restore stdout
-        sys.stdout = old_stdout
-
-        # Get captured output
-        output = captured_output.getvalue()
-
-        # Get result variable if it exists
-        result = exec_globals.get('result', None)
-
-        # Combine output and result
-        if output and result is not None:
-            return f"{output}\nResult: {result}"
-        elif output:
-            return output
-        elif result is not None:
-            return str(result)
-        else:
-            return "Script executed successfully, no output or result."
-
-    except Exception as e:
-        # Restore stdout in case of error
-        sys.stdout = old_stdout
-        return f"Error executing script: {str(e)}"
+    # Runs in a separate worker process with CPU, memory and time limits, see ScriptExecutor
+    return get_executor().execute(script)
 
 
 class AgentServer():
@@ -51,8 +25,9 @@ class AgentServer():
             api_base="http://localhost:11434/api/generate"
         )
         self.agent = ToolCallingAgent(
-            tools=[WebSearchTool(), PythonInterpreterTool(), run_script],
-            model=self.model
+            tools=[CachedWebSearchTool(), PythonInterpreterTool(), run_script],
+            model=self.model,
+            stream_outputs=True
         )
 
     def prompt_to_smolagent(self, msg: str) -> str:
@@ -67,6 +42,37 @@ class AgentServer():
         """
         return self.agent.run(msg)
 
+    def stream_smolagent(self, msg: str):
+        """
+        Send a prompt to the Agent and yield its progress as it happens.
+
+        Args:
+            msg: The message to send to the Agent.
+
+        Yields:
+            Event dicts with a "type" of "token", "tool_call", "tool_result", "step" or "final".
+        """
+        for event in self.agent.run(msg, stream=True):
+            if isinstance(event, ChatMessageStreamDelta):
+                if event.content:
+                    yield {"type": "token", "text": event.content}
+            elif isinstance(event, ToolCall):
+                yield {"type": "tool_call", "name": event.name, "arguments": event.arguments}
+            elif isinstance(event, ToolOutput):
+                yield {"type": "tool_result", "name": event.tool_call.name, "output": event.observation}
+            elif isinstance(event, ActionStep):
+                yield {"type": "step", "step": event.step_number}
+            elif isinstance(event, FinalAnswerStep):
+                yield {"type": "final", "text": str(event.output)}
+
+    def interrupt(self):
+        """Stop the current run before its next step, see AgentPool"""
+        self.agent.interrupt()
+
+    def reset(self):
+        """Clear the agent's memory so the instance can be reused for another request"""
+        self.agent.memory.reset()
+
 
 
 
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from smolagents import WebSearchTool
+
+# Defaults, can be changed with WEB_SEARCH_CACHE_SIZE, WEB_SEARCH_CACHE_TTL and WEB_SEARCH_CACHE_FILE
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_CACHE_TTL = 3600
+
+
+def normalize_query(query) -> str:
+    """Lowercase, collapse whitespace and drop surrounding quotes and punctuation so near-identical queries share an entry"""
+    text = unicodedata.normalize("NFKC", str(query)).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(" \"'`.,;:!?")
+
+
+def stub_search(query: str) -> list:
+    """Offline search backend returning made-up results, for testing without network access"""
+    delay = float(os.getenv("WEB_SEARCH_STUB_DELAY", "0"))
+    if delay:
+        time.sleep(delay)
+    return [
+        {"title": f"Result {i} for {query}", "link": f"https://example.com/{i}", "description": f"Stub result {i} about {query}."}
+        for i in range(1, 4)
+    ]
+
+
+class InFlight:
+    """A backend call other threads with the same query wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SearchCache:
+    """
+    Cache of web search results.
+
+    Entries are keyed on the search engine and the normalized query. Recently
+    used entries are kept in memory (LRU, at most `max_entries`), every entry
+    expires after `ttl` seconds. With a `disk_file` entries are also written to
+    a small SQLite database, so they survive restarts and are shared between
+    worker processes. Concurrent lookups of the same missing query share one
+    backend call (single-flight) instead of each sending its own.
+    Set WEB_SEARCH_CACHE_SIZE=0 to disable the cache.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, disk_file=None):
+        self.max_entries = int(os.getenv("WEB_SEARCH_CACHE_SIZE", DEFAULT_CACHE_SIZE)) if max_entries is None else max_entries
+        self.ttl = float(os.getenv("WEB_SEARCH_CACHE_TTL", DEFAULT_CACHE_TTL)) if ttl is None else ttl
+        self.disk_file = disk_file or os.getenv("WEB_SEARCH_CACHE_FILE")
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.conn = None
+        if self.enabled and self.disk_file:
+            self.conn = sqlite3.connect(self.disk_file, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+                )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(engine, query) -> str:
+        return hashlib.sha256(json.dumps([str(engine), normalize_query(query)]).encode("utf-8")).hexdigest()
+
+    def _lookup(self, key):
+        """Cached results for the key or None, must be called with the lock held"""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > now:
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.entries.pop(key, None)
+
+        if self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                results = json.loads(row[0])
+                self._remember(key, results, row[1])
+                self.disk_hits += 1
+                return results
+        return None
+
+    def _remember(self, key, results, expires_at):
+        """Add an entry to the memory tier, must be called with the lock held"""
+        self.entries[key] = (results, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _store(self, key, results):
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, results, expires_at)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO search_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                                      (key, json.dumps(results), expires_at))
+                    self.conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+
+    def get_or_search(self, key, search):
+        """Cached results for the key, otherwise the results of search(), called once for concurrent lookups"""
+        if not self.enabled:
+            return search()
+
+        with self.lock:
+            results = self._lookup(key)
+            if results is not None:
+                self.hits += 1
+                return results
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = InFlight()
+                self.in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.results
+
+        try:
+            flight.results = search()
+            self._store(key, flight.results)
+            return flight.results
+        except Exception as e:
+            # Errors aren't cached, the next lookup tries again
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    def clear(self):
+        """Drop all entries"""
+        with self.lock:
+            self.entries.clear()
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM search_cache")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+                "in_flight": len(self.in_flight),
+            }
+
+
+# Shared by all agents, so identical searches from different requests hit the same entries
+search_cache = SearchCache()
+
+
+class CachedWebSearchTool(WebSearchTool):
+    """
+    WebSearchTool answering repeated queries from a SearchCache.
+
+    `backend` is a function taking the query and returning a list of result dicts
+    with "title", "link" and "description"; by default the search engine of
+    WebSearchTool is used. WEB_SEARCH_ENGINE=stub uses stub_search instead, so
+    the agent can be tried without network access.
+    """
+
+    def __init__(self, max_results: int = 10, engine: str = None, backend=None, cache: SearchCache = None):
+        engine = engine or os.getenv("WEB_SEARCH_ENGINE", "duckduckgo")
+        if engine == "stub" and backend is None:
+            backend = stub_search
+        super().__init__(max_results=max_results, engine=engine)
+        self.backend = backend or super().search
+        self.cache = cache if cache is not None else search_cache
+
+    def search(self, query: str) -> list:
+        key = self.cache.make_key(f"{self.engine}:{self.max_results}", query)
+        return self.cache.get_or_search(key, lambda: self.backend(query))
@@ -0,0 +1,259 @@
+"""
+Runs the scripts of the run_script tool in a pool of worker processes.
+
+Every worker is a separate Python process started ahead of time, which runs one
+script at a time and is replaced after `max_runs` scripts. A script's output
+(print() as well as the output of programs it starts) is captured inside the
+worker, so scripts running at the same time don't mix their output and the web
+server's stdout is never touched. Each run is limited in CPU time, wall-clock
+time and memory; a worker which goes over a limit is killed and replaced.
+Requests and results go over the worker's stdin/stdout pipes as length-prefixed
+JSON messages.
+"""
+import atexit
+import io
+import json
+import os
+import queue
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows, only the wall-clock limit applies
+    resource = None
+
+# Defaults, can be changed with SCRIPT_WORKERS, SCRIPT_TIMEOUT, SCRIPT_CPU_TIME, SCRIPT_MEMORY_MB and SCRIPT_MAX_RUNS
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 30
+DEFAULT_CPU_TIME = 10
+DEFAULT_MEMORY_MB = 1024
+DEFAULT_MAX_RUNS = 50
+# Characters of output returned to the agent
+MAX_OUTPUT_CHARS = 20000
+
+
+def write_message(stream, message: dict):
+    data = json.dumps(message, default=str).encode("utf-8")
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def read_message(stream):
+    """Next message from the stream, None at end of stream"""
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    data = stream.read(struct.unpack(">I", header)[0])
+    return json.loads(data.decode("utf-8"))
+
+
+def format_result(output: str, result) -> str:
+    """Combine a script's output and its `result` variable the way run_script returns them"""
+    if output and result is not None:
+        return f"{output}\nResult: {result}"
+    elif output:
+        return output
+    elif result is not None:
+        return str(result)
+    else:
+        return "Script executed successfully, no output or result."
+
+
+class ScriptError(Exception):
+    """Raised when a script couldn't be run to the end (error, limit exceeded)"""
+
+
+class ScriptWorker:
+    """Parent side of one worker process"""
+
+    def __init__(self, cpu_time, memory_mb):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(cpu_time), str(memory_mb)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.runs = 0
+        self.replies = queue.Queue()
+        threading.Thread(target=self.read_replies, daemon=True).start()
+
+    def read_replies(self):
+        """Move the worker's messages to the replies queue, None when the worker exited"""
+        try:
+            while True:
+                message = read_message(self.process.stdout)
+                self.replies.put(message)
+                if message is None:
+                    return
+        except (OSError, ValueError):
+            self.replies.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, script: str, timeout: float) -> dict:
+        """Run a script and return the worker's reply, raises ScriptError when the worker died or was killed"""
+        self.runs += 1
+        try:
+            write_message(self.process.stdin, {"script": script})
+        except OSError:
+            raise ScriptError("Script worker is not running")
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise ScriptError(f"Script didn't finish within {timeout} seconds and was stopped")
+        if reply is None:
+            self.process.wait()
+            raise ScriptError(self.exit_reason())
+        return reply
+
+    def exit_reason(self) -> str:
+        code = self.process.returncode
+        if code is not None and code < 0:
+            if hasattr(signal, "SIGXCPU") and -code == signal.SIGXCPU:
+                return "Script used too much CPU time and was stopped"
+            return f"Script worker was killed by signal {-code}"
+        return f"Script worker exited with code {code}"
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        """Ask the worker to exit, kill it if it doesn't"""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+
+class ScriptExecutor:
+    """
+    Pool of script worker processes.
+
+    execute() waits for an idle worker, runs the script on it and returns the
+    combined output and result. At most `workers` scripts run at the same time,
+    on separate cores. A worker is replaced after `max_runs` scripts or when it
+    went over a limit, so leaks and state left behind by a script don't pile up.
+    """
+
+    def __init__(self, workers=None, timeout=None, cpu_time=None, memory_mb=None, max_runs=None):
+        self.workers = workers or int(os.getenv("SCRIPT_WORKERS", DEFAULT_WORKERS))
+        self.timeout = timeout or float(os.getenv("SCRIPT_TIMEOUT", DEFAULT_TIMEOUT))
+        self.cpu_time = cpu_time or int(os.getenv("SCRIPT_CPU_TIME", DEFAULT_CPU_TIME))
+        self.memory_mb = memory_mb or int(os.getenv("SCRIPT_MEMORY_MB", DEFAULT_MEMORY_MB))
+        self.max_runs = max_runs or int(os.getenv("SCRIPT_MAX_RUNS", DEFAULT_MAX_RUNS))
+        self.idle = queue.Queue()
+        for _ in range(self.workers):
+            self.idle.put(self.start_worker())
+
+    def start_worker(self) -> ScriptWorker:
+        return ScriptWorker(self.cpu_time, self.memory_mb)
+
+    def execute(self, script: str) -> str:
+        """Run a script in a worker and return its output and result"""
+        worker = self.idle.get()
+        try:
+            reply = worker.run(script, self.timeout)
+        except ScriptError as e:
+            return f"Error executing script: {e}"
+        finally:
+            if not worker.alive or worker.runs >= self.max_runs:
+                worker.close()
+                worker = self.start_worker()
+            self.idle.put(worker)
+
+        if reply.get("error"):
+            return f"Error executing script: {reply['error']}"
+        return format_result(reply["output"], reply.get("result"))
+
+    def shutdown(self):
+        """Stop the idle workers"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor() -> ScriptExecutor:
+    """The shared executor, its workers are started on the first call"""
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ScriptExecutor()
+            atexit.register(executor.shutdown)
+        return executor
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def worker_main(cpu_time: int, memory_mb: int):
+    """Worker process: run scripts received on stdin, reply on stdout"""
+    # Keep the pipes for the messages, the script's stdin reads nothing and its stdout/stderr go to a temp file
+    requests = os.fdopen(os.dup(0), "rb")
+    replies = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    if resource is not None:
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    cwd = os.getcwd()
+
+    while True:
+        request = read_message(requests)
+        if request is None:
+            return
+        if resource is not None:
+            # RLIMIT_CPU counts the whole process, so allow cpu_time more than used so far
+            limit = int(cpu_seconds()) + cpu_time
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, limit + 1))
+
+        with tempfile.TemporaryFile() as capture:
+            os.dup2(capture.fileno(), 1)
+            os.dup2(capture.fileno(), 2)
+            sys.stdout = sys.stderr = io.TextIOWrapper(open(capture.fileno(), "wb", closefd=False), line_buffering=True)
+            exec_globals = {"__name__": "__main__"}
+            error = None
+            try:
+                exec(request["script"], exec_globals)
+            except BaseException as e:
+                error = str(e) or traceback.format_exception_only(type(e), e)[-1].strip()
+            finally:
+                sys.stdout.flush()
+                sys.stdout = sys.__stdout__
+                sys.stderr = sys.__stderr__
+                os.dup2(devnull, 1)
+                os.dup2(devnull, 2)
+                os.chdir(cwd)
+
+            capture.seek(0)
+            output = capture.read(MAX_OUTPUT_CHARS * 4).decode("utf-8", errors="replace")[:MAX_OUTPUT_CHARS]
+
+        result = exec_globals.get("result", None)
+        if result is not None:
+            try:
+                result = str(result)
+            except Exception as e:
+                result, error = None, f"Can't convert result to text: {e}"
+        write_message(replies, {"output": output, "result": result, "error": error})
+
+
+if __name__ == "__main__":
+    worker_main(int(sys.argv[1]), int(sys.argv[2]))
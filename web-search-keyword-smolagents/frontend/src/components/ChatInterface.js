@@ -28,9 +28,49 @@ const ChatInterface = () => {
     setMessages(prev => [...prev, userMessage]);
     setIsLoading(true);
 
+    const botMessageId = Date.now() + 1;
+    let botMessageAdded = false;
+
+    // Create the bot message on the first event, then update it as more events arrive
+    const updateBotMessage = (update) => {
+      if (!botMessageAdded) {
+        botMessageAdded = true;
+        setMessages(prev => [...prev, {
+          id: botMessageId,
+          text: '',
+          steps: [],
+          sender: 'bot',
+          timestamp: new Date(),
+          ...update({ text: '', steps: [] })
+        }]);
+        return;
+      }
+      setMessages(prev => prev.map(message =>
+        message.id === botMessageId ? { ...message, ...update(message) } : message
+      ));
+    };
+
+    const handleEvent = (event) => {
+      switch (event.type) {
+        case 'token':
+          updateBotMessage(message => ({ text: message.text + event.text }));
+          break;
+        case 'tool_call':
+          updateBotMessage(message => ({ steps: [...message.steps, `Calling ${event.name}...`] }));
+          break;
+        case 'final':
+          updateBotMessage(() => ({ text: event.text || 'Sorry, I received an empty response.' }));
+          break;
+        case 'error':
+          throw new Error(event.message);
+        default:
+          break;
+      }
+    };
+
     try {
-      // Call the Python server's /call-agent endpoint
-      const response = await fetch('http://localhost:5000/call-agent', {
+      // Call the Python server's /call-agent-stream endpoint, it sends Server-Sent Events while the agent works
+      const response = await fetch('http://localhost:5000/call-agent-stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -44,22 +84,30 @@ const ChatInterface = () => {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
 
-      const botMessage = {
-        id: Date.now() + 1,
-        text: data.response || 'Sorry, I received an empty response.',
-        sender: 'bot',
-        timestamp: new Date()
-      };
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const chunks = buffer.split('\n\n');
+        buffer = chunks.pop();
 
-      setMessages(prev => [...prev, botMessage]);
+        for (const chunk of chunks) {
+          if (chunk.startsWith('data: ')) {
+            handleEvent(JSON.parse(chunk.slice(6)));
+          }
+        }
+      }
     } catch (error) {
       console.error('Error calling the agent:', error);
 
       // Show error message to user
       const errorMessage = {
-        id: Date.now() + 1,
+        id: Date.now() + 2,
         text: 'Sorry, I encountered an error while processing your request. Please make sure the server is running.',
         sender: 'bot',
         timestamp: new Date()
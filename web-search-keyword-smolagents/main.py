@@ -1,14 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
+import sys
 from AgentServer import *
+from ScriptExecutor import get_executor
+from CachedWebSearchTool import search_cache
+from AgentPool import AgentPool, AgentPoolFull, AgentPoolTimeout, AgentRunTimeout
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes to allow React frontend to communicate
 
+# Pre-built agents shared by all requests, sizes and timeouts come from AGENT_POOL_SIZE, AGENT_POOL_TIMEOUT,
+# AGENT_QUEUE_SIZE and AGENT_TIMEOUT
+agent_pool = AgentPool(AgentServer)
+# Start the run_script worker processes now instead of on the first script
+get_executor()
+
+def sse_event(event: dict) -> str:
+    """Format an event dict as a Server-Sent Events message"""
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+def busy_response(e: AgentPoolFull):
+    """429 response asking the client to retry later"""
+    response = jsonify({"error": "Server busy", "message": str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/', methods=['GET'])
 def home():
     return "nothing to see here, move along"
 
+@app.route('/search-stats', methods=['GET'])
+def search_stats():
+    """Hit/miss counters of the web search cache"""
+    return jsonify(search_cache.stats())
+
+@app.route('/queue-stats', methods=['GET'])
+def queue_stats():
+    """Busy/waiting/rejected counters of the agent pool"""
+    return jsonify(agent_pool.stats())
+
 @app.route('/call-agent', methods=['POST'])
 def call_agent():
     try:
@@ -22,13 +54,28 @@ def call_agent():
             return jsonify({"error": "No message provided"}), 400
         else:
 
-            agent = AgentServer()
-            response = agent.prompt_to_smolagent(msg)
+            with agent_pool.agent() as agent:
+                response = agent.prompt_to_smolagent(msg)
             # Return JSON response with 'response' key and 'hello' value
             return jsonify({
                 "response": response
             })
 
+    except AgentPoolFull as e:
+        return busy_response(e)
+
+    except AgentPoolTimeout as e:
+        return jsonify({
+            "error": "Server busy",
+            "message": str(e)
+        }), 503
+
+    except AgentRunTimeout as e:
+        return jsonify({
+            "error": "Timeout",
+            "message": str(e)
+        }), 504
+
     except Exception as e:
         # Handle any errors and return error response
         return jsonify({
@@ -36,5 +83,35 @@ def call_agent():
             "message": str(e)
         }), 400
 
+@app.route('/call-agent-stream', methods=['POST'])
+def call_agent_stream():
+    """Same as /call-agent but streams the agent's progress as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    msg = data.get('msg', '')
+    if not msg:
+        return jsonify({"error": "No message provided"}), 400
+    try:
+        # Checked before the response starts, so a full queue can still be answered with 429
+        agent_pool.check()
+    except AgentPoolFull as e:
+        return busy_response(e)
+
+    def generate():
+        try:
+            with agent_pool.agent() as agent:
+                for event in agent.stream_smolagent(msg):
+                    yield sse_event(event)
+        except Exception as e:
+            yield sse_event({"type": "error", "message": str(e)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if "--production" in sys.argv:
+        # Production mode: waitress with enough threads for the running and the waiting requests
+        from waitress import serve
+
+        serve(app, host='0.0.0.0', port=5000, threads=agent_pool.size + agent_pool.max_waiting + 4)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5000)